@@ -1 +1,3 @@
+from .client import EdenClient, Environment, CreateResult, DeleteResult
 
+__all__ = ['EdenClient', 'Environment', 'CreateResult', 'DeleteResult']
@@ -0,0 +1,239 @@
+import collections
+import concurrent.futures
+import logging
+import random
+import threading
+import time
+import uuid
+
+from . import consts, memory
+
+logger = logging.getLogger()
+
+OPERATIONS = ['put', 'delete', 'ls', 'profile']
+DEFAULT_MIX = 'put=40,delete=20,ls=10,profile=30'
+
+THROTTLE_CODES = {
+    'ProvisionedThroughputExceededException',
+    'ThrottlingException',
+    'RequestLimitExceeded',
+}
+
+
+def parse_mix(mix: str):
+    weights = {}
+
+    for part in mix.split(','):
+        operation, _, weight = part.partition('=')
+        operation = operation.strip()
+
+        if operation not in OPERATIONS:
+            logger.error(f"Unknown operation {operation} in mix, expected one of {', '.join(OPERATIONS)}")
+            return None
+
+        try:
+            weights[operation] = int(weight)
+        except ValueError:
+            logger.error(f"Invalid weight {weight} for operation {operation} in mix")
+            return None
+
+    if sum(weights.values()) <= 0:
+        logger.error("Operation mix weights must add up to more than 0")
+        return None
+
+    return weights
+
+
+def check_target(state, endpoint_url=None):
+    """
+    Returns False if state is the default table of a persistent backend,
+    benchmarks write and delete rows and must not run against the table eden commands use
+    """
+    if endpoint_url is not None or isinstance(state, memory.MemoryState):
+        return True
+
+    if state.get_table_name() == consts.DEFAULT_TABLE_NAME:
+        logger.error(f"Refusing to benchmark the default table {consts.DEFAULT_TABLE_NAME}, "
+                     f"use --endpoint-url or a dedicated --remote-table-name")
+        return False
+
+    return True
+
+
+def percentile(values: list, p: float):
+    # nearest-rank percentile of sorted values
+    if len(values) == 0:
+        return None
+    return values[min(len(values) - 1, max(0, int(round(p / 100 * len(values))) - 1))]
+
+
+class ThrottleCounter:
+    def __init__(self):
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def register(self, state):
+        # only DynamoDB backend can be throttled
+        clients = []
+        if hasattr(state, 'dynamodb_client'):
+            clients.append(state.dynamodb_client)
+        if hasattr(state, 'dynamodb_resource'):
+            clients.append(state.dynamodb_resource.meta.client)
+
+        for client in clients:
+            client.meta.events.register('needs-retry.dynamodb', self.handler)
+
+    def handler(self, response=None, **kwargs):
+        if response is None:
+            return None
+
+        code = response[1].get('Error', {}).get('Code')
+        if code in THROTTLE_CODES:
+            with self.lock:
+                self.count += 1
+
+        # do not change retry decision
+        return None
+
+
+class Client:
+    def __init__(self, index, state, profile_names, weights, operations, seed):
+        self.index = index
+        self.state = state
+        self.profile_names = profile_names
+        self.operations = operations
+
+        self.random = random.Random(seed)
+        self.population = list(weights.keys())
+        self.weights = list(weights.values())
+
+        # (profile name, environment name) this client expects to exist
+        self.expected = set()
+        self.sequence = 0
+
+        self.latencies = collections.defaultdict(list)
+        self.errors = collections.Counter()
+
+    def put(self):
+        profile_name = self.random.choice(self.profile_names)
+        name = f"c{self.index}-{self.sequence}"
+        self.sequence += 1
+
+        if self.state.put_environment(profile_name, name, f"{name}.bench.invalid") is None:
+            return False
+
+        self.expected.add((profile_name, name))
+        return True
+
+    def delete(self):
+        key = self.random.choice(sorted(self.expected))
+        if self.state.delete_environment(*key) is None:
+            return False
+
+        self.expected.discard(key)
+        return True
+
+    def ls(self):
+        return self.state.fetch_all_environments() is not None
+
+    def profile(self):
+        return self.state.fetch_profile(self.random.choice(self.profile_names)) is not None
+
+    def run(self):
+        for _ in range(self.operations):
+            operation = self.random.choices(self.population, self.weights)[0]
+
+            # nothing to delete yet, write (and measure) a put instead
+            if operation == 'delete' and len(self.expected) == 0:
+                operation = 'put'
+
+            started = time.perf_counter()
+            succeeded = getattr(self, operation)()
+            self.latencies[operation].append(time.perf_counter() - started)
+
+            if not succeeded:
+                self.errors[operation] += 1
+
+        return self
+
+
+def run(create_state, clients: int, operations: int, weights: dict, profiles: int, seed=None, keep=False):
+    """
+    Run clients concurrently against states returned by create_state(),
+    returns report dict, None if setup failed
+    """
+    run_id = uuid.uuid4().hex[:8]
+    profile_names = [f"bench-{run_id}-{i}" for i in range(profiles)]
+
+    setup_state = create_state()
+    for profile_name in profile_names:
+        if not setup_state.put_profile(profile_name, {'bench': run_id}):
+            return None
+
+    throttles = ThrottleCounter()
+    bench_clients = []
+    for i in range(clients):
+        client_state = create_state()
+        throttles.register(client_state)
+        bench_clients.append(Client(i, client_state, profile_names, weights, operations,
+                                    None if seed is None else seed + i))
+
+    logger.info(f"Running {clients} clients, {operations} operations each (run {run_id})")
+
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=clients) as executor:
+        list(executor.map(Client.run, bench_clients))
+    elapsed = time.perf_counter() - started
+
+    report = {
+        'run_id': run_id,
+        'clients': clients,
+        'elapsed': elapsed,
+        'operations': {},
+        'throttles': throttles.count,
+    }
+
+    total = 0
+    for operation in OPERATIONS:
+        latencies = sorted(latency for client in bench_clients for latency in client.latencies[operation])
+        if len(latencies) == 0:
+            continue
+
+        total += len(latencies)
+        report['operations'][operation] = {
+            'count': len(latencies),
+            'errors': sum(client.errors[operation] for client in bench_clients),
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+        }
+
+    report['total'] = total
+    report['throughput'] = total / elapsed if elapsed > 0 else None
+
+    # consistency check: rows written and not deleted by clients must be listed exactly once
+    expected = set(key for client in bench_clients for key in client.expected)
+
+    # eventually consistent scan could report rows written at the end of the run as lost
+    environments = setup_state.fetch_all_environments(consistent=True)
+    if environments is None:
+        return None
+
+    listed = collections.Counter(
+        (profile_name, environment['name'])
+        for profile_name in profile_names
+        for environment in environments.get(profile_name, [])
+    )
+
+    report['expected_rows'] = len(expected)
+    report['lost_rows'] = sorted(f"{p}/{n}" for p, n in expected - set(listed))
+    report['unexpected_rows'] = sorted(f"{p}/{n}" for p, n in set(listed) - expected)
+    report['duplicated_rows'] = sorted(f"{p}/{n}" for (p, n), count in listed.items() if count > 1)
+
+    if not keep:
+        for profile_name, name in listed:
+            setup_state.delete_environment(profile_name, name)
+        for profile_name in profile_names:
+            setup_state.delete_profile(profile_name)
+
+    return report
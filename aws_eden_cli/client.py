@@ -0,0 +1,254 @@
+import collections
+import concurrent.futures
+import datetime
+import logging
+import os
+import threading
+from typing import NamedTuple, Optional
+
+import boto3
+
+from . import consts, ecr, environments, fanout, sqlite, utils
+
+logger = logging.getLogger()
+
+
+class Environment(NamedTuple):
+    profile_name: str
+    name: str
+    cname: str
+    last_updated: datetime.datetime
+    image_uri: Optional[str] = None
+    # target the environment was listed from (see EdenClient.ls_targets)
+    source: Optional[str] = None
+
+
+class CreateResult(NamedTuple):
+    profile_name: str
+    name: str
+    cname: str
+    image_uri: str
+
+
+class DeleteResult(NamedTuple):
+    profile_name: str
+    name: str
+
+
+def to_environment(profile_name, item: dict):
+    return Environment(
+        profile_name=profile_name,
+        name=item['name'],
+        cname=item['endpoint'],
+        last_updated=datetime.datetime.fromtimestamp(float(item['last_updated'])),
+        image_uri=item.get('image_uri'),
+        source=item.get('source'),
+    )
+
+
+class EdenClient:
+    """
+    In-process eden API.
+
+    Holds one boto3 session (state table and ECR), the parsed configuration
+    and a thread pool for the *_many methods, so it is meant to be reused across calls:
+
+        with EdenClient(profile_name='api') as eden:
+            eden.create('foo', 'xxxxxxxxxx.dkr.ecr.ap-northeast-1.amazonaws.com/api:latest')
+            eden.ls()
+
+    profile overrides configuration file parameters, like the command line flags do.
+    ECS, ELBv2, Route 53 and S3 calls go through aws_eden_core module clients (created once per process).
+    Like the CLI, methods log errors and return None on failure.
+    """
+
+    def __init__(self, profile_name: str = consts.DEFAULT_PROFILE_NAME, config_path: str = '~/.eden/config',
+                 profile: dict = None, table_name: str = consts.DEFAULT_TABLE_NAME,
+                 state_backend: str = None, state_path: str = None, endpoint_url: str = None,
+                 session=None, workers: int = 8,
+                 lease_ttl: int = consts.DEFAULT_LEASE_TTL, no_lease: bool = False, no_snapshot: bool = False,
+                 image_cache_ttl: int = consts.DEFAULT_IMAGE_CACHE_TTL, no_image_cache: bool = False):
+        self.profile_name = profile_name
+        self.lease_ttl = lease_ttl
+        self.no_lease = no_lease
+        self.no_snapshot = no_snapshot
+
+        args = {
+            'remote_table_name': table_name,
+            'state_backend': state_backend,
+            'state_path': state_path,
+            'endpoint_url': endpoint_url,
+            **(profile or {}),
+        }
+
+        # missing configuration file is fine if the profile is given
+        config = utils.read_config(os.path.expanduser(config_path))
+        self.config, _ = utils.config_write_overrides(args, config, profile_name,
+                                                      fail_on_missing_non_default_profile=False)
+
+        # state table and ECR share credentials, one session is created for both
+        self.session = session or boto3.session.Session()
+
+        self.state = utils.create_state(args, self.config, profile_name, session=self.session)
+        if self.state is None:
+            raise ValueError(f"Unknown state backend {state_backend}")
+
+        self.resolver = ecr.ImageResolver(
+            cache_path=None if no_image_cache else consts.DEFAULT_IMAGE_CACHE_PATH,
+            ttl=image_cache_ttl,
+            session=self.session,
+        )
+
+        # target source -> state, so sessions and clients of ls_targets targets are reused
+        self.target_states = {}
+        self.target_states_lock = threading.Lock()
+
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+
+        self.profile = None
+        self.state_checked = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.executor.shutdown()
+
+        if isinstance(self.state, sqlite.SQLiteState):
+            self.state.connection.close()
+
+    def _get_profile(self):
+        if self.profile is None:
+            if utils.check_profile(self.config, self.profile_name) > 0:
+                raise ValueError(f"Profile {self.profile_name} is invalid, see log for details")
+            self.profile = utils.dump_profile({}, self.config, self.profile_name)
+        return self.profile
+
+    def _check_state(self):
+        if not self.state_checked:
+            self.state_checked = bool(self.state.check_remote_state_table(auto_create=True))
+        return self.state_checked
+
+    def _get_target_state(self, target: dict):
+        with self.target_states_lock:
+            if target['source'] not in self.target_states:
+                self.target_states[target['source']] = fanout.create_target_state(target)
+            return self.target_states[target['source']]
+
+    def _check_unique_names(self, names):
+        # results are keyed by name, and the same environment must not be changed by two threads
+        duplicates = sorted(name for name, count in collections.Counter(names).items() if count > 1)
+        if len(duplicates) > 0:
+            logger.error(f"Environment names given more than once: {', '.join(duplicates)}")
+            return False
+        return True
+
+    def _create(self, name, image_uri, resume):
+        try:
+            r = environments.create_environment(self.state, self.profile_name, name, image_uri, self._get_profile(),
+                                                self.lease_ttl, self.no_lease, self.no_snapshot, resume=resume)
+        except Exception as e:
+            logger.error(f"Failed to create environment {name}: {e}")
+            return None
+
+        if r is None:
+            return None
+        return CreateResult(self.profile_name, r['name'], r['cname'], r['image_uri'])
+
+    def _delete(self, name, resume):
+        try:
+            r = environments.delete_environment(self.state, self.profile_name, name, self._get_profile(), resume)
+        except Exception as e:
+            logger.error(f"Failed to delete environment {name}: {e}")
+            return None
+
+        if r is None:
+            return None
+        return DeleteResult(self.profile_name, r['name'])
+
+    def create(self, name: str, image_uri: str, resume: bool = False):
+        """Create environment or deploy image_uri to existent one, returns CreateResult"""
+        return self.create_many([(name, image_uri)], resume)[name]
+
+    def create_many(self, environments_to_create: list, resume: bool = False):
+        """
+        Create (name, image_uri) environments concurrently,
+        images are resolved with one ECR call per repository.
+        Returns a dict of name -> CreateResult, None for failed environments,
+        None if a name is given more than once.
+        """
+        if not self._check_unique_names([name for name, _ in environments_to_create]):
+            return None
+
+        if not self._check_state():
+            return {name: None for name, _ in environments_to_create}
+
+        resolved = self.resolver.resolve([image_uri for _, image_uri in environments_to_create])
+
+        futures = {}
+        for name, image_uri in environments_to_create:
+            if resolved[image_uri] is None:
+                futures[name] = None
+                continue
+            futures[name] = self.executor.submit(self._create, name, resolved[image_uri], resume)
+
+        return {name: future.result() if future else None for name, future in futures.items()}
+
+    def delete(self, name: str, resume: bool = False):
+        """Delete environment, returns DeleteResult"""
+        return self.delete_many([name], resume)[name]
+
+    def delete_many(self, names: list, resume: bool = False):
+        """
+        Delete environments concurrently, returns a dict of name -> DeleteResult, None for failed environments,
+        None if a name is given more than once.
+        """
+        if not self._check_unique_names(names):
+            return None
+
+        if not self._check_state():
+            return {name: None for name in names}
+
+        futures = {name: self.executor.submit(self._delete, name, resume) for name in names}
+        return {name: future.result() for name, future in futures.items()}
+
+    def ls(self, profile_names: list = None):
+        """List environments of all (or given) profiles, returns a list of Environment"""
+        items = self.state.fetch_all_environments()
+        if items is None:
+            return None
+
+        return sorted(
+            (
+                to_environment(profile_name, item)
+                for profile_name, profile_items in items.items()
+                if profile_names is None or profile_name in profile_names
+                for item in profile_items
+            ),
+            key=lambda e: (e.profile_name, e.name),
+        )
+
+    def ls_targets(self, targets: str, profile_names: list = None):
+        """
+        List environments from region[:aws_profile][:table],... targets concurrently (DynamoDB only).
+        Returns a tuple of Environment list and failed targets list.
+        """
+        parsed_targets = fanout.parse_targets(targets)
+        if parsed_targets is None:
+            return None, None
+
+        items, failed = fanout.fetch_all_environments(parsed_targets, self._get_target_state)
+
+        environment_list = sorted(
+            (
+                to_environment(profile_name, item)
+                for profile_name, profile_items in items.items()
+                if profile_names is None or profile_name in profile_names
+                for item in profile_items
+            ),
+            key=lambda e: (e.profile_name, e.name, e.source),
+        )
+        return environment_list, failed
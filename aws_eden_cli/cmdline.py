@@ -1,4 +1,5 @@
 import argparse
+import concurrent.futures
 import datetime
 import json
 import logging
@@ -6,14 +7,13 @@ import os
 import sys
 from pathlib import Path
 
-import aws_eden_core.methods
-
-from . import consts, utils, dynamodb
+from . import consts, utils, bench, dynamodb, ecr, environments, fanout, jobs, snapshot, transfer
+from .state import JOB_RUNNING
 
 logger = logging.getLogger()
 
 handlers_remote = []
-state = dynamodb.DynamoDBState(consts.DEFAULT_TABLE_NAME)
+state = None
 
 
 def create_parser():
@@ -46,6 +46,45 @@ def create_parser():
     parsers_remote.append(parser_ls)
     handlers_remote.append(command_ls)
 
+    # eden stats
+    parser_stats = subparsers.add_parser('stats', help='Show environment statistics')
+    parser_stats.set_defaults(handler=command_stats)
+    parsers.append(parser_stats)
+    parsers_remote.append(parser_stats)
+    handlers_remote.append(command_stats)
+
+    # eden bench
+    parser_bench = subparsers.add_parser('bench', help='Benchmark state backend with concurrent clients')
+    parser_bench.set_defaults(handler=command_bench)
+    parsers.append(parser_bench)
+    parsers_remote.append(parser_bench)
+    handlers_remote.append(command_bench)
+
+    # eden worker
+    parser_worker = subparsers.add_parser('worker', help='Run queued asynchronous jobs')
+    parser_worker.set_defaults(handler=command_worker)
+    parsers.append(parser_worker)
+    parsers_remote.append(parser_worker)
+    handlers_remote.append(command_worker)
+
+    # eden job *
+    parser_job = subparsers.add_parser('job', help='Show asynchronous job status')
+    job_subparsers = parser_job.add_subparsers()
+
+    # eden job status
+    parser_job_status = job_subparsers.add_parser('status', help='Show job status')
+    parser_job_status.set_defaults(handler=command_job_status)
+    parsers.append(parser_job_status)
+    parsers_remote.append(parser_job_status)
+    handlers_remote.append(command_job_status)
+
+    # eden job wait
+    parser_job_wait = job_subparsers.add_parser('wait', help='Wait for job to finish')
+    parser_job_wait.set_defaults(handler=command_job_wait)
+    parsers.append(parser_job_wait)
+    parsers_remote.append(parser_job_wait)
+    handlers_remote.append(command_job_wait)
+
     # eden config *
     parser_config = subparsers.add_parser('config', help='Configure eden')
 
@@ -86,6 +125,14 @@ def create_parser():
     parsers_remote.append(parser_config_ls)
     handlers_remote.append(command_config_ls)
 
+    # eden config snapshot
+    parser_config_snapshot = config_subparsers.add_parser('snapshot',
+                                                          help='Capture reference service snapshot for faster creates')
+    parser_config_snapshot.set_defaults(handler=command_config_snapshot)
+    parsers.append(parser_config_snapshot)
+    parsers_remote.append(parser_config_snapshot)
+    handlers_remote.append(command_config_snapshot)
+
     # eden config remote_remove
     parser_config_remote_delete = config_subparsers.add_parser('remote-rm',
                                                                help='Delete remote profile from DynamoDB')
@@ -94,6 +141,34 @@ def create_parser():
     parsers_remote.append(parser_config_remote_delete)
     handlers_remote.append(command_config_remote_delete)
 
+    # eden state *
+    parser_state = subparsers.add_parser('state', help='Export and import remote state table')
+    state_subparsers = parser_state.add_subparsers()
+
+    # eden state export
+    parser_state_export = state_subparsers.add_parser('export',
+                                                      help='Export remote state table to a compressed NDJSON file')
+    parser_state_export.set_defaults(handler=command_state_export)
+    parsers.append(parser_state_export)
+    parsers_remote.append(parser_state_export)
+    handlers_remote.append(command_state_export)
+
+    # eden state import
+    parser_state_import = state_subparsers.add_parser('import',
+                                                      help='Import compressed NDJSON file to remote state table')
+    parser_state_import.set_defaults(handler=command_state_import)
+    parsers.append(parser_state_import)
+    parsers_remote.append(parser_state_import)
+    handlers_remote.append(command_state_import)
+
+    # eden state migrate
+    parser_state_migrate = state_subparsers.add_parser('migrate',
+                                                       help='Migrate remote state table to another key layout')
+    parser_state_migrate.set_defaults(handler=command_state_migrate)
+    parsers.append(parser_state_migrate)
+    parsers_remote.append(parser_state_migrate)
+    handlers_remote.append(command_state_migrate)
+
     # profile vars for no profile or profile override
     for i in [parser_config_setup, parser_create, parser_delete]:
         for p in consts.parameters:
@@ -115,11 +190,97 @@ def create_parser():
         i.add_argument('--remote-table-name', type=str, required=False, default=consts.DEFAULT_TABLE_NAME,
                        help='Remote DynamoDB table name')
 
+    # state backend selection, saved to profile by config setup
+    for i in parsers_remote + [parser_config_setup]:
+        for p in consts.optional_parameters:
+            i.add_argument(p['flag'], type=str, required=False,
+                           help=p['help_string'])
+
     for i in [parser_create, parser_delete]:
         i.add_argument('--name', type=str, required=True, help='Environment name (branch name etc.)')
+        i.add_argument('--resume', action='store_true',
+                       help='Skip steps completed by the previous failed run (see journal)')
 
     parser_create.add_argument('--image-uri', type=str, required=True, help='Image URI to deploy '
                                                                             '(ECR repository path, image name and tag)')
+    parser_create.add_argument('--lease-ttl', type=int, required=False, default=consts.DEFAULT_LEASE_TTL,
+                               help='Seconds before a lease of a crashed create expires')
+    parser_create.add_argument('--no-lease', action='store_true',
+                               help='Do not deduplicate concurrent creates of the same environment')
+    parser_create.add_argument('--image-cache-ttl', type=int, required=False, default=consts.DEFAULT_IMAGE_CACHE_TTL,
+                               help='Seconds to cache image tag to digest resolution locally')
+    parser_create.add_argument('--no-image-cache', action='store_true',
+                               help='Always look up image in ECR')
+    parser_create.add_argument('--no-snapshot', action='store_true',
+                               help='Do not use reference snapshot, describe reference resources')
+    parser_create.add_argument('--async', dest='run_async', action='store_true',
+                               help='Queue create job for eden worker and return job ID immediately')
+
+    parser_config_snapshot.add_argument('--ttl', type=int, required=False, default=consts.DEFAULT_SNAPSHOT_TTL,
+                                        help='Seconds before snapshot expires')
+    parser_config_snapshot.add_argument('--invalidate', action='store_true',
+                                        help='Remove local and remote snapshot')
+
+    parser_worker.add_argument('--concurrency', type=int, required=False, default=4,
+                               help='Number of jobs to run concurrently')
+    parser_worker.add_argument('--poll-interval', type=float, required=False, default=5,
+                               help='Seconds between queue polls')
+    parser_worker.add_argument('--once', action='store_true',
+                               help='Exit when there are no more queued jobs')
+    parser_worker.add_argument('--job-ttl', type=int, required=False, default=consts.DEFAULT_JOB_TTL,
+                               help='Seconds before a job of a crashed worker is run again')
+
+    for i in [parser_job_status, parser_job_wait]:
+        i.add_argument('job_id', type=str, help='Job ID returned by eden create --async')
+
+    parser_job_wait.add_argument('--timeout', type=float, required=False, default=3600,
+                                 help='Seconds to wait before giving up')
+    parser_job_wait.add_argument('--poll-interval', type=float, required=False, default=5,
+                                 help='Seconds between job status polls')
+
+    for i in [parser_ls, parser_config_ls]:
+        i.add_argument('--targets', type=str, required=False,
+                       help='Comma separated list of region[:aws_profile][:table] to query concurrently '
+                            '(DynamoDB only)')
+
+    parser_stats.add_argument('--oldest', type=int, required=False, default=5,
+                              help='Number of oldest environments to show per profile')
+    parser_stats.add_argument('--format', type=str, required=False, default='table', choices=['table', 'json'],
+                              help='Output format')
+
+    parser_bench.add_argument('--endpoint-url', type=str, required=False,
+                              help='DynamoDB endpoint (DynamoDB Local or moto server), e.g. http://localhost:8000')
+    parser_bench.add_argument('--clients', type=int, required=False, default=8,
+                              help='Number of concurrent clients')
+    parser_bench.add_argument('--operations', type=int, required=False, default=100,
+                              help='Number of operations per client')
+    parser_bench.add_argument('--mix', type=str, required=False, default=bench.DEFAULT_MIX,
+                              help='Comma separated operation=weight list, operations: ' + ', '.join(bench.OPERATIONS))
+    parser_bench.add_argument('--profiles', type=int, required=False, default=1,
+                              help='Number of profiles clients write to')
+    parser_bench.add_argument('--seed', type=int, required=False,
+                              help='Random seed for reproducible workloads')
+    parser_bench.add_argument('--keep', action='store_true',
+                              help='Do not delete benchmark profiles and environments')
+    parser_bench.add_argument('--format', type=str, required=False, default='table', choices=['table', 'json'],
+                              help='Output format')
+
+    for i in [parser_state_export, parser_state_import]:
+        i.add_argument('--file', type=str, required=True, help='Snapshot file path (gzip compressed NDJSON)')
+
+    parser_state_export.add_argument('--segments', type=int, required=False, default=8,
+                                     help='Number of parallel scan segments')
+    parser_state_import.add_argument('--workers', type=int, required=False, default=8,
+                                     help='Number of concurrent BatchWriteItem workers')
+    parser_state_import.add_argument('--resume', action='store_true',
+                                     help='Resume interrupted import from checkpoint')
+
+    parser_state_migrate.add_argument('--shards', type=int, required=True,
+                                      help='Number of hash key shards per profile (1 for unsharded layout)')
+    parser_state_migrate.add_argument('--segments', type=int, required=False, default=8,
+                                      help='Number of parallel scan segments')
+    parser_state_migrate.add_argument('--workers', type=int, required=False, default=8,
+                                      help='Number of concurrent BatchWriteItem workers')
 
     return parser
 
@@ -127,30 +288,165 @@ def create_parser():
 def command_ls(args_dict: dict):
     setup_logging(args_dict['verbose'])
 
-    environments: dict = state.fetch_all_environments()
+    failed = []
+    if args_dict['targets']:
+        targets = fanout.parse_targets(args_dict['targets'])
+        if targets is None:
+            return
+
+        environments, failed = fanout.fetch_all_environments(targets)
+    else:
+        environments: dict = state.fetch_all_environments()
 
     if environments is None:
         return
 
     if len(environments) == 0:
         logger.info("No environments available")
-        return
 
     for profile_name in environments:
         logger.info(f"Profile {profile_name}:")
 
         for environment in environments[profile_name]:
-            last_updated = datetime.datetime.fromtimestamp(float(environment['last_updated_time']))
-            logger.info(f"{environment['name']} {environment['endpoint']} (last updated: {last_updated.isoformat()})")
+            last_updated = datetime.datetime.fromtimestamp(float(environment['last_updated']))
+            source = f" [{environment['source']}]" if 'source' in environment else ""
+            logger.info(f"{environment['name']} {environment['endpoint']} "
+                        f"(last updated: {last_updated.isoformat()}){source}")
+
+        logger.info("")
+
+    if len(failed) > 0:
+        logger.warning(f"Failed to fetch environments from {len(failed)} targets: {', '.join(failed)}")
+
+    return
+
+
+def command_stats(args_dict: dict):
+    setup_logging(args_dict['verbose'])
+
+    status = state.check_remote_state_table()
+    if not status:
+        return
 
+    now = datetime.datetime.now().timestamp()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(consts.STATS_AGE_BUCKETS) + 1) as executor:
+        counts_future = executor.submit(state.count_environments_by_profile)
+
+        histogram_futures = []
+        for label, lower, upper in consts.STATS_AGE_BUCKETS:
+            # ages in [lower, upper), environments on a bucket boundary are counted once
+            start = 0 if upper is None else now - upper
+            end = now - lower
+            histogram_futures.append((label, executor.submit(state.count_environments_updated_between, start, end)))
+
+        profile_counts: dict = counts_future.result()
+        histogram = [(label, f.result()) for label, f in histogram_futures]
+
+    if profile_counts is None or any(count is None for _, count in histogram):
+        return
+
+    oldest: dict = state.fetch_oldest_environments(args_dict['oldest'], profile_counts)
+    if oldest is None:
+        return
+
+    if args_dict['format'] == 'json':
+        stats = {
+            'total': sum(profile_counts.values()),
+            'profiles': {
+                profile_name: {
+                    'count': count,
+                    'oldest': oldest.get(profile_name, []),
+                } for profile_name, count in sorted(profile_counts.items())
+            },
+            'age_histogram': {label: count for label, count in histogram},
+        }
+        logger.info(json.dumps(stats, indent=4))
+        return
+
+    logger.info(f"Total environments: {sum(profile_counts.values())}")
+    logger.info("")
+
+    logger.info(f"{'PROFILE':<32} {'COUNT':>8}")
+    for profile_name, count in sorted(profile_counts.items()):
+        logger.info(f"{profile_name:<32} {count:>8}")
+    logger.info("")
+
+    logger.info(f"{'AGE':<32} {'COUNT':>8}")
+    for label, count in histogram:
+        logger.info(f"{label:<32} {count:>8}")
+    logger.info("")
+
+    for profile_name in sorted(oldest):
+        logger.info(f"Oldest environments in profile {profile_name}:")
+        for environment in oldest[profile_name]:
+            last_updated = datetime.datetime.fromtimestamp(environment['last_updated'])
+            logger.info(f"{environment['name']} (last updated: {last_updated.isoformat()})")
         logger.info("")
 
     return
 
 
+def command_bench(args_dict: dict):
+    setup_logging(args_dict['verbose'])
+
+    if not bench.check_target(state, args_dict['endpoint_url']):
+        return
+
+    status = state.check_remote_state_table(auto_create=True)
+    if not status:
+        return
+
+    weights = bench.parse_mix(args_dict['mix'])
+    if weights is None:
+        return
+
+    def create_client_state():
+        # every DynamoDB client gets its own session and connection pool,
+        # local backends are shared
+        if isinstance(state, dynamodb.DynamoDBState):
+            return dynamodb.DynamoDBState(state.get_table_name(), endpoint_url=args_dict['endpoint_url'])
+        return state
+
+    report = bench.run(create_client_state, args_dict['clients'], args_dict['operations'], weights,
+                       args_dict['profiles'], args_dict['seed'], args_dict['keep'])
+    if report is None:
+        return
+
+    if args_dict['format'] == 'json':
+        logger.info(json.dumps(report, indent=4))
+        return
+
+    logger.info(f"Completed {report['total']} operations in {report['elapsed']:.2f}s "
+                f"({report['throughput']:.1f} ops/s, {report['clients']} clients)")
+    logger.info("")
+
+    logger.info(f"{'OPERATION':<12} {'COUNT':>8} {'ERRORS':>8} {'P50 MS':>10} {'P95 MS':>10} {'P99 MS':>10}")
+    for operation, result in report['operations'].items():
+        logger.info(f"{operation:<12} {result['count']:>8} {result['errors']:>8} "
+                    f"{result['p50'] * 1000:>10.2f} {result['p95'] * 1000:>10.2f} {result['p99'] * 1000:>10.2f}")
+    logger.info("")
+
+    logger.info(f"Throttled requests: {report['throttles']}")
+    logger.info(f"Expected rows: {report['expected_rows']}")
+
+    for key, label in [('lost_rows', 'Lost'), ('unexpected_rows', 'Unexpected'), ('duplicated_rows', 'Duplicated')]:
+        rows = report[key]
+        if len(rows) > 0:
+            logger.warning(f"{label} rows ({len(rows)}): {', '.join(rows)}")
+        else:
+            logger.info(f"{label} rows: 0")
+
+    return
+
+
 def command_config_ls(args_dict: dict):
     setup_logging(args_dict['verbose'])
 
+    if args_dict['targets']:
+        command_config_ls_targets(args_dict['targets'])
+        return
+
     status = state.check_remote_state_table()
     if not status:
         return
@@ -177,6 +473,31 @@ def command_config_ls(args_dict: dict):
     return
 
 
+def command_config_ls_targets(targets: str):
+    targets = fanout.parse_targets(targets)
+    if targets is None:
+        return
+
+    profiles, failed = fanout.fetch_all_profiles(targets)
+
+    if len(profiles) == 0:
+        logger.info("No profiles available")
+
+    for profile_name, sources in profiles.items():
+        for source, profile in sources:
+            logger.info(f"Profile {profile_name} [{source}]:")
+
+            profile_dict = json.loads(profile)
+
+            for k, v in profile_dict.items():
+                logger.info(f"{k} = {v}")
+
+            logger.info("")
+
+    if len(failed) > 0:
+        logger.warning(f"Failed to fetch profiles from {len(failed)} targets: {', '.join(failed)}")
+
+
 def command_config_setup(args_dict: dict):
     setup_logging(args_dict['verbose'])
     profile_name = args_dict['profile']
@@ -271,6 +592,53 @@ def command_config_pull(args_dict: dict):
     logger.info(f"Successfully pulled profile {profile_name} to local configuration")
 
 
+def command_config_snapshot(args_dict: dict):
+    setup_logging(args_dict['verbose'])
+    profile_name = args_dict['profile']
+
+    status = state.check_remote_state_table()
+    if not status:
+        return
+
+    if args_dict['invalidate']:
+        snapshot.remove_local(profile_name)
+
+        status = state.delete_profile_snapshot(profile_name)
+        if not status:
+            return
+
+        logger.info(f"Successfully invalidated reference snapshot of profile {profile_name}")
+        return
+
+    config = utils.parse_config(args_dict)
+    if config is None:
+        return
+
+    profile = utils.dump_profile(args_dict, config, profile_name)
+
+    # versions keep increasing even if local and remote snapshots diverged
+    previous_versions = [0]
+    local_snapshot = snapshot.load_local(profile_name)
+    if local_snapshot:
+        previous_versions.append(local_snapshot['version'])
+    remote_snapshot = state.fetch_profile_snapshot(profile_name)
+    if remote_snapshot:
+        previous_versions.append(json.loads(remote_snapshot)['version'])
+    version = max(previous_versions) + 1
+
+    profile_snapshot = snapshot.capture(profile, args_dict['ttl'], version)
+    snapshot.save_local(profile_name, profile_snapshot)
+
+    status = state.put_profile_snapshot(profile_name, snapshot.dumps(profile_snapshot), profile_snapshot['id'])
+    if status is None:
+        return
+    elif not status:
+        logger.warning(f"Profile {profile_name} not found in remote table, snapshot is saved locally only "
+                       f"(push profile with \"eden config push\" first)")
+
+    logger.info(f"Successfully captured reference snapshot version {version} of profile {profile_name}")
+
+
 def command_config_remote_delete(args_dict: dict):
     setup_logging(args_dict['verbose'])
     profile_name = args_dict['profile']
@@ -286,6 +654,64 @@ def command_config_remote_delete(args_dict: dict):
     logger.info(f"Successfully removed profile {profile_name} from DynamoDB table {state.get_table_name()}")
 
 
+def command_state_export(args_dict: dict):
+    setup_logging(args_dict['verbose'])
+    path = os.path.expanduser(args_dict['file'])
+
+    status = state.check_remote_state_table()
+    if not status:
+        return
+
+    exported = transfer.export_state(state, path, args_dict['segments'])
+    if exported is None:
+        return
+
+    logger.info(f"Successfully exported {exported} items from state table {state.get_table_name()} to {path}")
+
+
+def command_state_import(args_dict: dict):
+    setup_logging(args_dict['verbose'])
+    path = os.path.expanduser(args_dict['file'])
+
+    if not os.path.isfile(path):
+        logger.error(f"Snapshot file {path} does not exist")
+        return
+
+    status = state.check_remote_state_table(auto_create=True)
+    if not status:
+        return
+
+    imported = transfer.import_state(state, path, args_dict['workers'], args_dict['resume'])
+    if imported is None:
+        return
+
+    logger.info(f"Successfully imported {imported} items from {path} to state table {state.get_table_name()}")
+
+
+def command_state_migrate(args_dict: dict):
+    setup_logging(args_dict['verbose'])
+    shards = args_dict['shards']
+
+    if not isinstance(state, dynamodb.DynamoDBState):
+        logger.error("Key layout migration is only supported by dynamodb state backend")
+        return
+
+    if shards < 1:
+        logger.error("Number of shards must be 1 or more")
+        return
+
+    status = state.check_remote_state_table()
+    if not status:
+        return
+
+    status = state.migrate_layout(shards, args_dict['segments'], args_dict['workers'])
+    if not status:
+        logger.error("Migration failed, rerun the same command to finish it")
+        return
+
+    logger.info(f"Successfully migrated DynamoDB table {state.get_table_name()} to {shards} shards")
+
+
 def command_create(args_dict: dict):
     name = args_dict['name']
     image_uri = args_dict['image_uri']
@@ -307,8 +733,37 @@ def command_create(args_dict: dict):
 
     profile = utils.dump_profile(args_dict, config, profile_name)
 
-    r = aws_eden_core.methods.create_env(name, image_uri, profile)
-    state.put_environment(profile_name, r['name'], r['cname'])
+    # resolve tag to digest once, so the deployment (and async job) is pinned to the verified image
+    resolver = ecr.ImageResolver(
+        cache_path=None if args_dict['no_image_cache'] else consts.DEFAULT_IMAGE_CACHE_PATH,
+        ttl=args_dict['image_cache_ttl'],
+    )
+    image_uri = resolver.resolve([image_uri])[image_uri]
+    if image_uri is None:
+        return
+
+    if args_dict['run_async']:
+        job = jobs.create_job('create', profile_name, name, {
+            'image_uri': image_uri,
+            'lease_ttl': args_dict['lease_ttl'],
+            'no_lease': args_dict['no_lease'],
+            'no_snapshot': args_dict['no_snapshot'],
+            'resume': args_dict['resume'],
+        }, profile)
+
+        status = state.put_job(job)
+        if not status:
+            return
+
+        logger.info(f"Queued job {job['name']}")
+        return
+
+    r = environments.create_environment(state, profile_name, name, image_uri, profile, args_dict['lease_ttl'],
+                                        args_dict['no_lease'], args_dict['no_snapshot'], resume=args_dict['resume'])
+    if r is None:
+        return
+
+    logger.info(f"Environment {r['name']} is available at {r['cname']}")
 
 
 def command_delete(args_dict: dict):
@@ -331,8 +786,82 @@ def command_delete(args_dict: dict):
 
     profile = utils.dump_profile(args_dict, config, profile_name)
 
-    r = aws_eden_core.methods.delete_env(name, profile)
-    state.delete_environment(profile_name, r['name'])
+    environments.delete_environment(state, profile_name, name, profile, args_dict['resume'])
+
+
+def execute_job(job: dict, progress):
+    parameters = json.loads(job['parameters'])
+    profile = json.loads(job['profile'])
+
+    # jobs of crashed workers continue from the journal
+    resume = parameters.get('resume', False) or job['status'] == JOB_RUNNING
+
+    if job['operation'] == 'create':
+        return environments.create_environment(state, job['profile_name'], job['environment_name'],
+                                               parameters['image_uri'], profile,
+                                               parameters['lease_ttl'], parameters['no_lease'],
+                                               parameters.get('no_snapshot', False), progress, resume)
+
+    raise ValueError(f"Unknown job operation {job['operation']}")
+
+
+def command_worker(args_dict: dict):
+    setup_logging(args_dict['verbose'])
+
+    status = state.check_remote_state_table(auto_create=True)
+    if not status:
+        return
+
+    jobs.run_worker(state, execute_job, args_dict['concurrency'], args_dict['poll_interval'],
+                    args_dict['job_ttl'], args_dict['once'])
+
+
+def log_job(job: dict):
+    logger.info(f"Job {job['name']}: {job['status']}")
+    logger.info(f"{job['operation']} {job['environment_name']} (profile {job['profile_name']}, "
+                f"created at {job['created_at']})")
+
+    for step in job['steps']:
+        finished_at = f", finished at {step['finished_at']}" if 'finished_at' in step else ""
+        logger.info(f"  {step['step']}: {step['status']} (started at {step['started_at']}{finished_at})")
+
+    if 'result' in job:
+        logger.info(f"Result: {job['result']}")
+
+    if 'error' in job:
+        logger.error(f"Error: {job['error']}")
+
+
+def command_job_status(args_dict: dict):
+    setup_logging(args_dict['verbose'])
+
+    status = state.check_remote_state_table()
+    if not status:
+        return
+
+    job = state.fetch_job(args_dict['job_id'])
+    if job is None:
+        logger.error(f"Job {args_dict['job_id']} not found")
+        return
+
+    log_job(job)
+
+
+def command_job_wait(args_dict: dict):
+    setup_logging(args_dict['verbose'])
+
+    status = state.check_remote_state_table()
+    if not status:
+        return
+
+    job = jobs.wait(state, args_dict['job_id'], args_dict['timeout'], args_dict['poll_interval'])
+    if job is None:
+        exit(-1)
+
+    log_job(job)
+
+    if job['status'] != jobs.JOB_SUCCEEDED:
+        exit(-1)
 
 
 def setup_logging(debug):
@@ -369,9 +898,10 @@ def main(args=None):
         # configure state if working with remote commands,
         # make state inaccessible otherwise
         if args.handler in handlers_remote:
-            table_name = args.remote_table_name
-            if table_name != consts.DEFAULT_TABLE_NAME:
-                state = dynamodb.DynamoDBState(table_name)
+            config = utils.parse_config(args_dict)
+            state = utils.create_state(args_dict, config, args.profile)
+            if state is None:
+                exit(-1)
         else:
             state = None
 
@@ -2,6 +2,28 @@ from aws_eden_core import validators
 
 DEFAULT_TABLE_NAME = 'eden'
 DEFAULT_PROFILE_NAME = 'default'
+DEFAULT_STATE_BACKEND = 'dynamodb'
+DEFAULT_STATE_PATH = '~/.eden/state.db'
+DEFAULT_LEASE_TTL = 60
+DEFAULT_JOB_TTL = 60
+
+DEFAULT_IMAGE_CACHE_PATH = '~/.eden/cache/images.json'
+DEFAULT_IMAGE_CACHE_TTL = 300
+DEFAULT_IMAGE_NEGATIVE_CACHE_TTL = 30
+
+DEFAULT_SNAPSHOT_DIRECTORY = '~/.eden/snapshots'
+DEFAULT_SNAPSHOT_TTL = 6 * 60 * 60
+
+STATE_BACKENDS = ['dynamodb', 'sqlite', 'memory']
+
+# (label, lower bound, upper bound) of environment age in seconds, None means unbounded
+STATS_AGE_BUCKETS = [
+    ('< 1h', 0, 60 * 60),
+    ('1h - 1d', 60 * 60, 24 * 60 * 60),
+    ('1d - 7d', 24 * 60 * 60, 7 * 24 * 60 * 60),
+    ('7d - 30d', 7 * 24 * 60 * 60, 30 * 24 * 60 * 60),
+    ('>= 30d', 30 * 24 * 60 * 60, None),
+]
 
 parameters = [
     {
@@ -83,6 +105,22 @@ parameters = [
     },
 ]
 
+# optional parameters are not required by profiles and are not pushed to remote profiles
+optional_parameters = [
+    {
+        'name': 'state_backend',
+        'validator': lambda value: value in STATE_BACKENDS,
+        'help_string': f"State backend ({', '.join(STATE_BACKENDS)})",
+        'flag': '--state-backend',
+    },
+    {
+        'name': 'state_path',
+        'validator': validators.is_string,
+        'help_string': f"SQLite state backend database path (default: {DEFAULT_STATE_PATH})",
+        'flag': '--state-path',
+    },
+]
+
 parameter_names = set()
-for p in parameters:
+for p in parameters + optional_parameters:
     parameter_names.add(p['name'])
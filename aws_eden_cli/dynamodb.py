@@ -1,27 +1,163 @@
+import collections
+import concurrent.futures
 import datetime
 import decimal
+import heapq
 import json
 import logging
+import queue
 import time
+import zlib
 
 import botocore
+import botocore.config
 import boto3
 from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+from .state import State, lease_key, job_key, journal_key, JOURNAL_KIND, LEASE_RUNNING, LEASE_SUCCEEDED, \
+    JOB_QUEUED, JOB_RUNNING, JOB_KIND_QUEUED, JOB_KIND_RUNNING
 
 logger = logging.getLogger()
 
+MAX_POOL_CONNECTIONS = 32
+
+PROFILE_HASH_KEY = '_profile'
+ENVIRONMENT_KIND = 'environment'
+LAYOUT_KEY = {
+    'type': '_meta',
+    'name': 'layout',
+}
+# layout of tables without layout row
+DEFAULT_LAYOUT = {
+    'shards': 1,
+    'version': 0,
+    'migrating': False,
+}
+
+# writers re-read the layout at least this often (seconds),
+# migrations wait LAYOUT_MIGRATION_GRACE after setting the migrating flag,
+# so every writer has seen the flag (and stopped writing) before rows are copied
+LAYOUT_CACHE_TTL = 10
+LAYOUT_MIGRATION_GRACE = 2 * LAYOUT_CACHE_TTL + 5
+# writers wait this long (seconds) for a running migration to finish
+LAYOUT_WAIT_TIMEOUT = 600
+LAYOUT_POLL_INTERVAL = 2
+
+# index rows read per request by fetch_oldest_environments
+OLDEST_PAGE_SIZE = 100
+
+
+def shard_key(hash_key: str, range_key: str, shards: int):
+    # 1 shard is the original (unsharded) layout
+    if shards <= 1:
+        return hash_key
+    return f"{hash_key}#{zlib.crc32(range_key.encode()) % shards}"
+
+
+def shard_keys(hash_key: str, shards: int):
+    if shards <= 1:
+        return [hash_key]
+    return [f"{hash_key}#{i}" for i in range(shards)]
+
+
+def environment_kind(name: str, shards: int):
+    # kind is the hash key of kind_last_updated_gsi, it is sharded like the table hash key,
+    # otherwise every environment write would go to the same index partition
+    return shard_key(ENVIRONMENT_KIND, name, shards)
+
+
+def is_environment_kind(kind: str):
+    return kind == ENVIRONMENT_KIND or kind.startswith(f"{ENVIRONMENT_KIND}#")
 
-class DynamoDBState:
-    def __init__(self, table_name: str):
-        self.dynamodb_client = boto3.client('dynamodb')
-        self.dynamodb_resource = boto3.resource('dynamodb')
+
+class DynamoDBState(State):
+    def __init__(self, table_name: str, session: boto3.session.Session = None, endpoint_url: str = None):
+        # parallel scans and fan-out share the connection pool of one client
+        session = session or boto3.session.Session()
+        config = botocore.config.Config(max_pool_connections=MAX_POOL_CONNECTIONS)
+
+        # endpoint_url points the backend to DynamoDB Local or moto server
+        self.dynamodb_client = session.client('dynamodb', config=config, endpoint_url=endpoint_url)
+        self.dynamodb_resource = session.resource('dynamodb', config=config, endpoint_url=endpoint_url)
 
         self.table_name = table_name
         self.table = self.dynamodb_resource.Table(table_name)
 
+        # methods used by create and delete run on worker and EdenClient pool threads,
+        # they use the thread safe client instead of the table resource
+        self.serializer = TypeSerializer()
+        self.deserializer = TypeDeserializer()
+
+        # (layout, time it was read)
+        self.layout = None
+
     def get_table_name(self):
         return self.table_name
 
+    def _serialize(self, item: dict):
+        return {k: self.serializer.serialize(v) for k, v in item.items()}
+
+    def _deserialize(self, item: dict):
+        return {k: self.deserializer.deserialize(v) for k, v in item.items()}
+
+    def get_layout(self, refresh: bool = False):
+        # key layout is stored in the table itself and cached for LAYOUT_CACHE_TTL
+        if refresh or self.layout is None or time.time() - self.layout[1] > LAYOUT_CACHE_TTL:
+            r = self.dynamodb_client.get_item(
+                TableName=self.table_name,
+                Key={k: {'S': v} for k, v in LAYOUT_KEY.items()},
+                ConsistentRead=True,
+            )
+            layout = dict(DEFAULT_LAYOUT)
+            if 'Item' in r:
+                layout['shards'] = int(r['Item']['shards']['N'])
+                layout['version'] = int(r['Item']['version']['N']) if 'version' in r['Item'] else 1
+                layout['migrating'] = r['Item'].get('migrating', {}).get('BOOL', False)
+                if layout['migrating']:
+                    layout['target_shards'] = int(r['Item']['target_shards']['N'])
+                    layout['migrating_since'] = float(r['Item']['migrating_since']['N'])
+
+            self.layout = (layout, time.time())
+            logger.debug(f"Table {self.table_name} key layout: {layout}")
+
+        return self.layout[0]
+
+    def get_shards(self, refresh: bool = False):
+        return self.get_layout(refresh)['shards']
+
+    def _get_writable_shards(self):
+        # rows must not be written while a migration copies them
+        deadline = time.time() + LAYOUT_WAIT_TIMEOUT
+        layout = self.get_layout()
+
+        while layout['migrating']:
+            if time.time() >= deadline:
+                raise ValueError(f"Table {self.table_name} is being migrated to {layout['target_shards']} shards, "
+                                 f"try again later")
+
+            logger.info(f"Table {self.table_name} is being migrated to {layout['target_shards']} shards, waiting")
+            time.sleep(LAYOUT_POLL_INTERVAL)
+            layout = self.get_layout(refresh=True)
+
+        return layout['shards']
+
+    def _profile_key(self, profile_name, shards: int = None):
+        return {
+            'type': shard_key(PROFILE_HASH_KEY, profile_name, shards or self.get_shards()),
+            'name': profile_name,
+        }
+
+    def _environment_key(self, profile_name, name, shards: int = None):
+        return {
+            'type': shard_key(profile_name, name, shards or self.get_shards()),
+            'name': name,
+        }
+
+    def _is_current_environment_key(self, env_type, profile_name, name):
+        # rows left over by an interrupted layout migration are hidden
+        return env_type == shard_key(profile_name, name, self.get_shards())
+
     def describe_remote_state_table(self):
         response = self.dynamodb_client.describe_table(TableName=self.table_name)
         table_status = response['Table']['TableStatus']
@@ -136,10 +272,7 @@ class DynamoDBState:
     def delete_profile(self, profile_name):
         try:
             self.table.delete_item(
-                Key={
-                    'type': '_profile',
-                    'name': profile_name,
-                },
+                Key=self._profile_key(profile_name, self._get_writable_shards()),
             )
         except Exception as e:
             if hasattr(e, 'response') and 'Error' in e.response:
@@ -154,8 +287,7 @@ class DynamoDBState:
         try:
             self.table.put_item(
                 Item={
-                    'type': '_profile',
-                    'name': profile_name,
+                    **self._profile_key(profile_name, self._get_writable_shards()),
                     'profile': json.dumps(profile_dict),
                     'kind': 'profile'
                 }
@@ -169,11 +301,21 @@ class DynamoDBState:
                 return False
         return True
 
-    def fetch_all_environments(self):
+    def fetch_all_environments(self, consistent: bool = False):
         environments = {}
 
         try:
-            r = self.table.scan()
+            shards = self.get_shards(refresh=True)
+
+            items = []
+            kwargs = {'ConsistentRead': True} if consistent else {}
+            while True:
+                r = self.table.scan(**kwargs)
+                items += r['Items']
+
+                if 'LastEvaluatedKey' not in r:
+                    break
+                kwargs['ExclusiveStartKey'] = r['LastEvaluatedKey']
         except Exception as e:
             if hasattr(e, 'response') and 'Error' in e.response:
                 code = e.response['Error']['Code']
@@ -187,11 +329,18 @@ class DynamoDBState:
                 logger.error(f"Unknown exception raised: {e}")
                 return None
 
-        for item in r['Items']:
+        for item in items:
             env_type: str = item.pop('type')
-            if env_type == '_profile':
+            if not is_environment_kind(item.get('kind', '')):
                 continue
 
+            # sharded rows keep the profile name in a separate attribute
+            profile_name = item.pop('profile', env_type)
+            if env_type != shard_key(profile_name, item['name'], shards):
+                continue
+            env_type = profile_name
+            item['kind'] = ENVIRONMENT_KIND
+
             if env_type not in environments:
                 environments[env_type] = []
 
@@ -202,10 +351,23 @@ class DynamoDBState:
     def fetch_all_profiles(self):
         profiles = {}
 
+        def query_shard(hash_key):
+            items = []
+            for page in self._paginate(
+                'query',
+                KeyConditionExpression='#type = :type',
+                ExpressionAttributeNames={'#type': 'type'},
+                ExpressionAttributeValues={':type': {'S': hash_key}},
+            ):
+                items += page['Items']
+            return items
+
         try:
-            r = self.table.query(
-                KeyConditionExpression=Key('type').eq('_profile')
-            )
+            shards = self.get_shards(refresh=True)
+            hash_keys = shard_keys(PROFILE_HASH_KEY, shards)
+            # scatter-gather over all profile shards
+            with concurrent.futures.ThreadPoolExecutor(max_workers=len(hash_keys)) as executor:
+                items = [item for shard_items in executor.map(query_shard, hash_keys) for item in shard_items]
         except Exception as e:
             if hasattr(e, 'response') and 'Error' in e.response:
                 code = e.response['Error']['Code']
@@ -219,22 +381,32 @@ class DynamoDBState:
                 logger.error(f"Unknown exception raised: {e}")
                 return None
 
-        for item in r['Items']:
-            name = item['name']
-            profile = item['profile']
+        for item in items:
+            name = item['name']['S']
+            if item['type']['S'] != shard_key(PROFILE_HASH_KEY, name, shards):
+                continue
+
+            profile = item['profile']['S']
 
             profiles[name] = profile
 
         return profiles
 
+    def _get_profile_item(self, profile_name, **kwargs):
+        # cached layout may be outdated by a migration, retry missing profiles with the current one
+        shards = self.get_shards()
+        r = self.dynamodb_client.get_item(TableName=self.table_name,
+                                          Key=self._serialize(self._profile_key(profile_name, shards)), **kwargs)
+
+        if 'Item' not in r and self.get_shards(refresh=True) != shards:
+            r = self.dynamodb_client.get_item(TableName=self.table_name,
+                                              Key=self._serialize(self._profile_key(profile_name)), **kwargs)
+
+        return {'Item': self._deserialize(r['Item'])} if 'Item' in r else {}
+
     def fetch_profile(self, profile_name):
         try:
-            r = self.table.get_item(
-                Key={
-                    'type': '_profile',
-                    'name': profile_name,
-                }
-            )
+            r = self._get_profile_item(profile_name)
         except Exception as e:
             if hasattr(e, 'response') and 'Error' in e.response:
                 logger.error(e.response['Error']['Message'])
@@ -260,16 +432,22 @@ class DynamoDBState:
 
         return profile_json
 
-    def put_environment(self, profile_name, name, cname):
+    def put_environment(self, profile_name, name, cname, image_uri=None):
         try:
-            return self.table.put_item(
-                Item={
-                    'type': profile_name,
-                    'name': name,
-                    'last_updated': decimal.Decimal(datetime.datetime.now().timestamp()),
-                    'endpoint': cname,
-                    'kind': 'environment',
-                }
+            shards = self._get_writable_shards()
+            item = {
+                **self._environment_key(profile_name, name, shards),
+                'profile': profile_name,
+                'last_updated': decimal.Decimal(datetime.datetime.now().timestamp()),
+                'endpoint': cname,
+                'kind': environment_kind(name, shards),
+            }
+            if image_uri is not None:
+                item['image_uri'] = image_uri
+
+            return self.dynamodb_client.put_item(
+                TableName=self.table_name,
+                Item=self._serialize(item),
             )
         except Exception as e:
             if hasattr(e, 'response') and 'Error' in e.response:
@@ -281,11 +459,610 @@ class DynamoDBState:
 
     def delete_environment(self, profile_name, name):
         try:
-            return self.table.delete_item(
-                Key={
-                    'type': profile_name,
+            return self.dynamodb_client.delete_item(
+                TableName=self.table_name,
+                Key=self._serialize(self._environment_key(profile_name, name, self._get_writable_shards())),
+            )
+        except Exception as e:
+            if hasattr(e, 'response') and 'Error' in e.response:
+                logger.error(e.response['Error']['Message'])
+                return None
+            else:
+                logger.error(f"Unknown exception raised: {e}")
+                return None
+
+    def _paginate(self, operation: str, **kwargs):
+        method = getattr(self.dynamodb_client, operation)
+        kwargs['TableName'] = self.table_name
+
+        while True:
+            r = method(**kwargs)
+            yield r
+
+            if 'LastEvaluatedKey' not in r:
+                return
+            kwargs['ExclusiveStartKey'] = r['LastEvaluatedKey']
+
+    def _parallel_scan(self, segments: int, **kwargs):
+        # low-level client is thread safe, resources are not,
+        # so segments are scanned with the client and yield raw (typed) items
+        # pages are streamed through a queue as soon as any segment returns them
+        pages = queue.Queue()
+
+        def scan_segment(segment):
+            try:
+                for page in self._paginate('scan', Segment=segment, TotalSegments=segments, **kwargs):
+                    pages.put(page.get('Items', []))
+            finally:
+                pages.put(None)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=segments) as executor:
+            futures = [executor.submit(scan_segment, segment) for segment in range(segments)]
+
+            finished = 0
+            while finished < segments:
+                items = pages.get()
+                if items is None:
+                    finished += 1
+                    continue
+
+                yield from items
+
+            # re-raise segment exceptions, if any
+            for future in futures:
+                future.result()
+
+    def _environment_kinds(self):
+        # environment rows are spread over one index partition per shard
+        return shard_keys(ENVIRONMENT_KIND, self.get_shards(refresh=True))
+
+    def _query_environments(self, key_condition: str, names: dict, values: dict, **kwargs):
+        # keys and last_updated of current layout environment rows, pages are read as they are consumed;
+        # leftovers of an interrupted migration can share index partitions with current rows and are skipped
+        for page in self._paginate(
+            'query',
+            ProjectionExpression='#type, #name, #profile, #last_updated',
+            KeyConditionExpression=key_condition,
+            ExpressionAttributeNames={
+                '#type': 'type',
+                '#name': 'name',
+                '#profile': 'profile',
+                '#last_updated': 'last_updated',
+                **names,
+            },
+            ExpressionAttributeValues=values,
+            **kwargs,
+        ):
+            for item in page['Items']:
+                profile_name = item['profile']['S'] if 'profile' in item else item['type']['S']
+                if self._is_current_environment_key(item['type']['S'], profile_name, item['name']['S']):
+                    yield profile_name, item['name']['S'], float(item['last_updated']['N'])
+
+    def _query_environment_kind(self, kind: str, **kwargs):
+        return self._query_environments('#kind = :kind', {'#kind': 'kind'}, {':kind': {'S': kind}},
+                                        IndexName='kind_last_updated_gsi', **kwargs)
+
+    def count_environments_by_profile(self):
+        # Select=COUNT cannot tell leftover rows of an interrupted migration from current ones,
+        # so keys of all environment index partitions are queried in parallel and counted here
+        def count_kind(kind):
+            counts = collections.Counter()
+            for profile_name, _, _ in self._query_environment_kind(kind):
+                counts[profile_name] += 1
+            return counts
+
+        try:
+            kinds = self._environment_kinds()
+            with concurrent.futures.ThreadPoolExecutor(max_workers=len(kinds)) as executor:
+                return dict(sum(executor.map(count_kind, kinds), collections.Counter()))
+        except Exception as e:
+            if hasattr(e, 'response') and 'Error' in e.response:
+                logger.error(e.response['Error']['Message'])
+                return None
+            else:
+                logger.error(f"Unknown exception raised: {e}")
+                return None
+
+    def count_environments_updated_between(self, start: float, end: float):
+        def count_kind(kind):
+            # BETWEEN is inclusive, rows updated exactly at start belong to the previous bucket
+            items = self._query_environments(
+                '#kind = :kind AND #last_updated BETWEEN :start AND :end',
+                {'#kind': 'kind'},
+                {
+                    ':kind': {'S': kind},
+                    ':start': {'N': str(start)},
+                    ':end': {'N': str(end)},
+                },
+                IndexName='kind_last_updated_gsi',
+            )
+            return len([last_updated for _, _, last_updated in items if last_updated > start])
+
+        try:
+            kinds = self._environment_kinds()
+            with concurrent.futures.ThreadPoolExecutor(max_workers=len(kinds)) as executor:
+                return sum(executor.map(count_kind, kinds))
+        except Exception as e:
+            if hasattr(e, 'response') and 'Error' in e.response:
+                logger.error(e.response['Error']['Message'])
+                return None
+            else:
+                logger.error(f"Unknown exception raised: {e}")
+                return None
+
+    def _query_profile_environments(self, profile_name):
+        # environment rows of one profile, read from its table partitions
+        for hash_key in shard_keys(profile_name, self.get_shards()):
+            yield from self._query_environments('#type = :type', {}, {':type': {'S': hash_key}})
+
+    def fetch_oldest_environments(self, limit: int, profile_counts: dict):
+        oldest = {}
+        # profiles still missing environments, with the number of rows reading them directly would cost
+        unsatisfied = {k: v for k, v in profile_counts.items() if min(v, limit) > 0}
+        remaining = sum(unsatisfied.values())
+        read = 0
+
+        try:
+            # merge index partitions of all shards in last_updated order, in small pages,
+            # so reading stops soon after every profile has enough environments
+            items = heapq.merge(
+                *[self._query_environment_kind(kind, ScanIndexForward=True, Limit=OLDEST_PAGE_SIZE)
+                  for kind in self._environment_kinds()],
+                key=lambda i: i[2],
+            )
+
+            for profile_name, name, last_updated in items:
+                # profiles with only recent environments are found near the end of the index,
+                # once their own rows are cheaper to read, they are queried directly
+                if read >= remaining:
+                    break
+                read += 1
+
+                environments = oldest.setdefault(profile_name, [])
+                if len(environments) >= limit:
+                    continue
+
+                environments.append({
                     'name': name,
+                    'last_updated': last_updated,
+                })
+
+                if profile_name in unsatisfied and len(environments) >= min(limit, unsatisfied[profile_name]):
+                    remaining -= unsatisfied.pop(profile_name)
+
+            for profile_name in unsatisfied:
+                items = sorted(self._query_profile_environments(profile_name), key=lambda i: i[2])
+                oldest[profile_name] = [
+                    {'name': name, 'last_updated': last_updated} for _, name, last_updated in items[:limit]
+                ]
+        except Exception as e:
+            if hasattr(e, 'response') and 'Error' in e.response:
+                logger.error(e.response['Error']['Message'])
+                return None
+            else:
+                logger.error(f"Unknown exception raised: {e}")
+                return None
+
+        return oldest
+
+    def _export_item(self, item: dict, shards: int):
+        # exported rows use the unsharded layout, batch_write_items re-keys them to the layout of the target table
+        name = item['name']['S']
+
+        if item['kind']['S'] == 'profile':
+            if item['type']['S'] != shard_key(PROFILE_HASH_KEY, name, shards):
+                return None
+            return dict(item, type={'S': PROFILE_HASH_KEY})
+
+        profile_name = item['profile']['S'] if 'profile' in item else item['type']['S']
+        if item['type']['S'] != shard_key(profile_name, name, shards):
+            return None
+        return dict(item, type={'S': profile_name}, profile={'S': profile_name}, kind={'S': ENVIRONMENT_KIND})
+
+    def _import_item(self, item: dict, shards: int):
+        name = item['name']['S']
+
+        if item['kind']['S'] == 'profile':
+            return dict(item, type={'S': shard_key(PROFILE_HASH_KEY, name, shards)})
+
+        # files exported by older versions may contain sharded keys
+        profile_name = item['profile']['S'] if 'profile' in item else item['type']['S']
+        return dict(
+            item,
+            type={'S': shard_key(profile_name, name, shards)},
+            profile={'S': profile_name},
+            kind={'S': environment_kind(name, shards)},
+        )
+
+    def export_items(self, segments: int = 4):
+        # raw DynamoDB JSON items, suitable for batch_write_items
+        shards = self.get_shards(refresh=True)
+
+        # rows left over by an interrupted layout migration are not exported
+        for item in self._parallel_scan(
+            segments,
+            FilterExpression='begins_with(#kind, :environment) OR #kind = :profile',
+            ExpressionAttributeNames={'#kind': 'kind'},
+            ExpressionAttributeValues={':environment': {'S': ENVIRONMENT_KIND}, ':profile': {'S': 'profile'}},
+        ):
+            item = self._export_item(item, shards)
+            if item is not None:
+                yield item
+
+    def _batch_write(self, requests: list, max_retries: int = 8):
+        request_items = {
+            self.table_name: requests,
+        }
+
+        try:
+            for attempt in range(max_retries + 1):
+                r = self.dynamodb_client.batch_write_item(RequestItems=request_items)
+
+                request_items = r.get('UnprocessedItems', {})
+                if not request_items:
+                    return True
+
+                delay = min(0.05 * 2 ** attempt, 5)
+                logger.debug(f"{len(request_items[self.table_name])} unprocessed items, retrying in {delay}s")
+                time.sleep(delay)
+
+        except Exception as e:
+            if hasattr(e, 'response') and 'Error' in e.response:
+                logger.error(e.response['Error']['Message'])
+                return False
+            else:
+                logger.error(f"Unknown exception raised: {e}")
+                return False
+
+        logger.error(f"Failed to write {len(request_items[self.table_name])} items after {max_retries} retries")
+        return False
+
+    def _batch_write_concurrently(self, requests: list, workers: int):
+        # BatchWriteItem accepts at most 25 requests
+        batches = [requests[i:i + 25] for i in range(0, len(requests), 25)]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            return all(executor.map(self._batch_write, batches))
+
+    def batch_write_items(self, items: list, max_retries: int = 8):
+        # rows are written with the layout of this table, whatever table they were exported from
+        try:
+            shards = self._get_writable_shards()
+        except Exception as e:
+            if hasattr(e, 'response') and 'Error' in e.response:
+                logger.error(e.response['Error']['Message'])
+                return False
+            else:
+                logger.error(f"Unknown exception raised: {e}")
+                return False
+
+        return self._batch_write([{'PutRequest': {'Item': self._import_item(item, shards)}} for item in items],
+                                 max_retries)
+
+    def _put_layout(self, layout: dict, expected_version: int):
+        # conditional on the version read before, so concurrent migrations do not interleave
+        item = {
+            **{k: {'S': v} for k, v in LAYOUT_KEY.items()},
+            'kind': {'S': 'meta'},
+            'shards': {'N': str(layout['shards'])},
+            'version': {'N': str(layout['version'])},
+            'migrating': {'BOOL': layout['migrating']},
+        }
+        if layout['migrating']:
+            item['target_shards'] = {'N': str(layout['target_shards'])}
+            item['migrating_since'] = {'N': str(layout['migrating_since'])}
+
+        kwargs = {}
+        if expected_version == 0:
+            kwargs['ConditionExpression'] = 'attribute_not_exists(#name)'
+            kwargs['ExpressionAttributeNames'] = {'#name': 'name'}
+        else:
+            kwargs['ConditionExpression'] = '#version = :version'
+            kwargs['ExpressionAttributeNames'] = {'#version': 'version'}
+            kwargs['ExpressionAttributeValues'] = {':version': {'N': str(expected_version)}}
+
+        try:
+            self.dynamodb_client.put_item(TableName=self.table_name, Item=item, **kwargs)
+        except Exception as e:
+            if hasattr(e, 'response') and 'Error' in e.response:
+                if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                    logger.error(f"Key layout of table {self.table_name} was changed by another migration")
+                else:
+                    logger.error(e.response['Error']['Message'])
+                return False
+            else:
+                logger.error(f"Unknown exception raised: {e}")
+                return False
+
+        self.layout = (layout, time.time())
+        return True
+
+    def _update_kinds(self, kind_updates: list, workers: int):
+        # conditional updates of the kind only, writers may be running (the layout does not change)
+        if len(kind_updates) == 0:
+            return True
+
+        logger.info(f"Moving {len(kind_updates)} environments to sharded index keys")
+
+        def update_kind(kind_update):
+            key, kind, new_kind = kind_update
+            return self._conditional_update(
+                key,
+                'SET #kind = :new_kind',
+                '#kind = :kind',
+                {'#kind': 'kind'},
+                {':kind': kind, ':new_kind': new_kind},
+            ) is not None
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            return all(executor.map(update_kind, kind_updates))
+
+    def migrate_layout(self, shards: int, segments: int = 8, workers: int = 8):
+        """
+        Copy rows to the new layout, switch layout, then remove old rows.
+        Writers are stopped by the migrating flag of the layout row while rows are copied,
+        an interrupted migration is finished by running it again with the same shards.
+        """
+        try:
+            layout = self.get_layout(refresh=True)
+        except Exception as e:
+            if hasattr(e, 'response') and 'Error' in e.response:
+                logger.error(e.response['Error']['Message'])
+                return False
+            else:
+                logger.error(f"Unknown exception raised: {e}")
+                return False
+
+        if layout['migrating'] and layout['target_shards'] != shards:
+            logger.error(f"Interrupted migration of table {self.table_name} to {layout['target_shards']} shards "
+                         f"found, finish it first with --shards {layout['target_shards']}")
+            return False
+
+        current_shards = layout['shards']
+
+        # same layout: only rows left over by an interrupted migration are removed, writers are not stopped
+        if current_shards != shards:
+            if layout['migrating']:
+                logger.info(f"Resuming interrupted migration to {shards} shards")
+                migrating_layout = layout
+            else:
+                migrating_layout = {
+                    'shards': current_shards,
+                    'version': layout['version'] + 1,
+                    'migrating': True,
+                    'target_shards': shards,
+                    'migrating_since': time.time(),
+                }
+                if not self._put_layout(migrating_layout, layout['version']):
+                    return False
+
+            # writers read the layout at most LAYOUT_CACHE_TTL seconds before writing
+            grace = migrating_layout['migrating_since'] + LAYOUT_MIGRATION_GRACE - time.time()
+            if grace > 0:
+                logger.info(f"Writes to table {self.table_name} are stopped, "
+                            f"waiting {grace:.0f}s for running writes to finish")
+                time.sleep(grace)
+
+        puts = []
+        deletes = []
+        # (key, kind, new kind) of rows written before index keys were sharded
+        kind_updates = []
+
+        try:
+            # consistent scan, so rows written just before the migrating flag are copied too
+            for item in self._parallel_scan(segments, ConsistentRead=True):
+                kind = item['kind']['S'] if 'kind' in item else ''
+                item_type = item['type']['S']
+                name = item['name']['S']
+
+                if is_environment_kind(kind):
+                    profile_name = item['profile']['S'] if 'profile' in item else item_type
+                    hash_key = profile_name
+                elif kind == 'profile':
+                    hash_key = PROFILE_HASH_KEY
+                else:
+                    continue
+
+                new_type = shard_key(hash_key, name, shards)
+                if item_type == new_type:
+                    if is_environment_kind(kind) and kind != environment_kind(name, shards):
+                        kind_updates.append(({'type': item_type, 'name': name}, kind, environment_kind(name, shards)))
+                    continue
+
+                # rows left over by an interrupted migration are only deleted
+                if item_type == shard_key(hash_key, name, current_shards):
+                    new_item = dict(item, type={'S': new_type})
+                    if is_environment_kind(kind):
+                        new_item['profile'] = {'S': profile_name}
+                        new_item['kind'] = {'S': environment_kind(name, shards)}
+                    puts.append({'PutRequest': {'Item': new_item}})
+
+                deletes.append({'DeleteRequest': {'Key': {'type': item['type'], 'name': item['name']}}})
+
+        except Exception as e:
+            if hasattr(e, 'response') and 'Error' in e.response:
+                logger.error(e.response['Error']['Message'])
+                return False
+            else:
+                logger.error(f"Unknown exception raised: {e}")
+                return False
+
+        logger.info(f"Migrating {len(puts)} rows from {current_shards} to {shards} shards")
+
+        # copy rows first, then switch layout (and resume writes), then remove old rows,
+        # so readers see a complete table during the whole migration
+        if not self._batch_write_concurrently(puts, workers):
+            return False
+
+        if not self._update_kinds(kind_updates, workers):
+            return False
+
+        if current_shards != shards:
+            switched_layout = {
+                'shards': shards,
+                'version': migrating_layout['version'] + 1,
+                'migrating': False,
+            }
+            if not self._put_layout(switched_layout, migrating_layout['version']):
+                return False
+
+        logger.info(f"Switched table {self.table_name} to {shards} shards, removing {len(deletes)} old rows")
+
+        # writers never use old keys again, so removing old rows cannot lose writes
+        return self._batch_write_concurrently(deletes, workers)
+
+    def _conditional_update(self, key: dict, update_expression: str, condition_expression: str,
+                            names: dict, values: dict):
+        # returns False if condition failed
+        # uses thread safe client, as leases are renewed from heartbeat threads
+        try:
+            self.dynamodb_client.update_item(
+                TableName=self.table_name,
+                Key=self._serialize(key),
+                UpdateExpression=update_expression,
+                ConditionExpression=condition_expression,
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues=self._serialize(values),
+            )
+        except Exception as e:
+            if hasattr(e, 'response') and 'Error' in e.response:
+                if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                    return False
+                logger.error(e.response['Error']['Message'])
+                return None
+            else:
+                logger.error(f"Unknown exception raised: {e}")
+                return None
+        return True
+
+    def acquire_lease(self, profile_name, name, holder, image_uri, ttl):
+        now = time.time()
+
+        try:
+            self.dynamodb_client.put_item(
+                TableName=self.table_name,
+                Item=self._serialize({
+                    **lease_key(profile_name, name),
+                    'kind': 'lease',
+                    'holder': holder,
+                    'status': LEASE_RUNNING,
+                    'image_uri': image_uri,
+                    'expires_at': decimal.Decimal(str(now + ttl)),
+                }),
+                ConditionExpression='attribute_not_exists(#name) OR #status <> :running OR #expires_at < :now',
+                ExpressionAttributeNames={
+                    '#name': 'name',
+                    '#status': 'status',
+                    '#expires_at': 'expires_at',
                 },
+                ExpressionAttributeValues=self._serialize({
+                    ':running': LEASE_RUNNING,
+                    ':now': decimal.Decimal(str(now)),
+                }),
+            )
+        except Exception as e:
+            if hasattr(e, 'response') and 'Error' in e.response:
+                if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                    return False
+                logger.error(e.response['Error']['Message'])
+                return None
+            else:
+                logger.error(f"Unknown exception raised: {e}")
+                return None
+        return True
+
+    def fetch_lease(self, profile_name, name):
+        try:
+            r = self.dynamodb_client.get_item(
+                TableName=self.table_name,
+                Key=self._serialize(lease_key(profile_name, name)),
+                ConsistentRead=True,
+            )
+        except Exception as e:
+            if hasattr(e, 'response') and 'Error' in e.response:
+                logger.error(e.response['Error']['Message'])
+                return None
+            else:
+                logger.error(f"Unknown exception raised: {e}")
+                return None
+
+        return self._deserialize(r['Item']) if 'Item' in r else None
+
+    def renew_lease(self, profile_name, name, holder, ttl):
+        return bool(self._conditional_update(
+            lease_key(profile_name, name),
+            'SET #expires_at = :expires_at',
+            '#holder = :holder AND #status = :running',
+            {'#expires_at': 'expires_at', '#holder': 'holder', '#status': 'status'},
+            {
+                ':expires_at': decimal.Decimal(str(time.time() + ttl)),
+                ':holder': holder,
+                ':running': LEASE_RUNNING,
+            },
+        ))
+
+    def request_lease_image(self, profile_name, name, image_uri):
+        return bool(self._conditional_update(
+            lease_key(profile_name, name),
+            'SET #image_uri = :image_uri',
+            '#status = :running AND #expires_at >= :now',
+            {'#image_uri': 'image_uri', '#status': 'status', '#expires_at': 'expires_at'},
+            {
+                ':image_uri': image_uri,
+                ':running': LEASE_RUNNING,
+                ':now': decimal.Decimal(str(time.time())),
+            },
+        ))
+
+    def release_lease(self, profile_name, name, holder, status, deployed_image_uri, result):
+        condition_expression = '#holder = :holder'
+        names = {
+            '#holder': 'holder',
+            '#status': 'status',
+            '#deployed_image_uri': 'deployed_image_uri',
+            '#result': 'result',
+        }
+
+        # a newer image may have been requested while deploying
+        if status == LEASE_SUCCEEDED:
+            condition_expression += ' AND #image_uri = :deployed_image_uri'
+            names['#image_uri'] = 'image_uri'
+
+        return bool(self._conditional_update(
+            lease_key(profile_name, name),
+            'SET #status = :status, #deployed_image_uri = :deployed_image_uri, #result = :result',
+            condition_expression,
+            names,
+            {
+                ':holder': holder,
+                ':status': status,
+                ':deployed_image_uri': deployed_image_uri,
+                ':result': json.dumps(result),
+            },
+        ))
+
+    def put_job(self, job: dict):
+        try:
+            self.dynamodb_client.put_item(
+                TableName=self.table_name,
+                Item=self._serialize(job),
+                ConditionExpression='attribute_not_exists(#name)',
+                ExpressionAttributeNames={'#name': 'name'},
+            )
+        except Exception as e:
+            if hasattr(e, 'response') and 'Error' in e.response:
+                logger.error(e.response['Error']['Message'])
+                return False
+            else:
+                logger.error(f"Unknown exception raised: {e}")
+                return False
+        return True
+
+    def fetch_job(self, job_id):
+        try:
+            r = self.dynamodb_client.get_item(
+                TableName=self.table_name,
+                Key=self._serialize(job_key(job_id)),
+                ConsistentRead=True,
             )
         except Exception as e:
             if hasattr(e, 'response') and 'Error' in e.response:
@@ -294,3 +1071,240 @@ class DynamoDBState:
             else:
                 logger.error(f"Unknown exception raised: {e}")
                 return None
+
+        return self._deserialize(r['Item']) if 'Item' in r else None
+
+    def fetch_queued_jobs(self, limit: int):
+        now = decimal.Decimal(str(time.time()))
+
+        try:
+            r = self.table.query(
+                IndexName='kind_last_updated_gsi',
+                KeyConditionExpression=Key('kind').eq(JOB_KIND_QUEUED),
+                ScanIndexForward=True,
+                Limit=limit,
+            )
+            jobs = r['Items']
+
+            # last_updated of running jobs is the end of their claim
+            if len(jobs) < limit:
+                r = self.table.query(
+                    IndexName='kind_last_updated_gsi',
+                    KeyConditionExpression=Key('kind').eq(JOB_KIND_RUNNING) & Key('last_updated').lt(now),
+                    ScanIndexForward=True,
+                    Limit=limit - len(jobs),
+                )
+                jobs += r['Items']
+
+        except Exception as e:
+            if hasattr(e, 'response') and 'Error' in e.response:
+                logger.error(e.response['Error']['Message'])
+                return None
+            else:
+                logger.error(f"Unknown exception raised: {e}")
+                return None
+
+        return jobs
+
+    def claim_job(self, job_id, worker, ttl):
+        # GSI reads are eventually consistent, the condition makes sure only one worker gets the job
+        now = time.time()
+        claimed_until = decimal.Decimal(str(now + ttl))
+
+        return bool(self._conditional_update(
+            job_key(job_id),
+            'SET #status = :running, #kind = :kind, #worker = :worker, '
+            '#claimed_until = :claimed_until, #last_updated = :claimed_until',
+            '#status = :queued OR (#status = :running AND #claimed_until < :now)',
+            {
+                '#status': 'status',
+                '#kind': 'kind',
+                '#worker': 'worker',
+                '#claimed_until': 'claimed_until',
+                '#last_updated': 'last_updated',
+            },
+            {
+                ':running': JOB_RUNNING,
+                ':queued': JOB_QUEUED,
+                ':kind': JOB_KIND_RUNNING,
+                ':worker': worker,
+                ':claimed_until': claimed_until,
+                ':now': decimal.Decimal(str(now)),
+            },
+        ))
+
+    def renew_job(self, job_id, worker, ttl):
+        claimed_until = decimal.Decimal(str(time.time() + ttl))
+
+        return bool(self._conditional_update(
+            job_key(job_id),
+            'SET #claimed_until = :claimed_until, #last_updated = :claimed_until',
+            '#status = :running AND #worker = :worker',
+            {
+                '#status': 'status',
+                '#worker': 'worker',
+                '#claimed_until': 'claimed_until',
+                '#last_updated': 'last_updated',
+            },
+            {
+                ':running': JOB_RUNNING,
+                ':worker': worker,
+                ':claimed_until': claimed_until,
+            },
+        ))
+
+    def _set_attributes(self, attributes: dict):
+        # returns SET expression with its attribute names and values
+        names = {}
+        values = {}
+        assignments = []
+
+        for i, (k, v) in enumerate(attributes.items()):
+            names[f"#a{i}"] = k
+            values[f":v{i}"] = v
+            assignments.append(f"#a{i} = :v{i}")
+
+        return f"SET {', '.join(assignments)}", names, values
+
+    def _update_attributes(self, key: dict, attributes: dict):
+        # set attributes of an existing item
+        update_expression, names, values = self._set_attributes(attributes)
+
+        return bool(self._conditional_update(
+            key,
+            update_expression,
+            'attribute_exists(#name)',
+            {**names, '#name': 'name'},
+            values,
+        ))
+
+    def finish_job(self, job_id, worker, attributes: dict):
+        update_expression, names, values = self._set_attributes(attributes)
+
+        # without last_updated the job is not in kind_last_updated_gsi anymore
+        return bool(self._conditional_update(
+            job_key(job_id),
+            f"{update_expression} REMOVE #last_updated",
+            '#status = :running AND #worker = :worker',
+            {**names, '#status': 'status', '#worker': 'worker', '#last_updated': 'last_updated'},
+            {**values, ':running': JOB_RUNNING, ':worker': worker},
+        ))
+
+    def update_job(self, job_id, attributes: dict):
+        return self._update_attributes(job_key(job_id), attributes)
+
+    def put_journal(self, profile_name, name, journal: dict):
+        try:
+            self.dynamodb_client.put_item(
+                TableName=self.table_name,
+                Item=self._serialize({
+                    **journal_key(profile_name, name),
+                    'kind': JOURNAL_KIND,
+                    **journal,
+                }),
+            )
+        except Exception as e:
+            if hasattr(e, 'response') and 'Error' in e.response:
+                logger.error(e.response['Error']['Message'])
+                return False
+            else:
+                logger.error(f"Unknown exception raised: {e}")
+                return False
+        return True
+
+    def fetch_journal(self, profile_name, name):
+        try:
+            r = self.dynamodb_client.get_item(
+                TableName=self.table_name,
+                Key=self._serialize(journal_key(profile_name, name)),
+                ConsistentRead=True,
+            )
+        except Exception as e:
+            if hasattr(e, 'response') and 'Error' in e.response:
+                logger.error(e.response['Error']['Message'])
+                return None
+            else:
+                logger.error(f"Unknown exception raised: {e}")
+                return None
+
+        return self._deserialize(r['Item']) if 'Item' in r else None
+
+    def update_journal(self, profile_name, name, attributes: dict):
+        return self._update_attributes(journal_key(profile_name, name), attributes)
+
+    def put_profile_snapshot(self, profile_name, snapshot: str, snapshot_id: str):
+        try:
+            self.table.update_item(
+                Key=self._profile_key(profile_name, self._get_writable_shards()),
+                UpdateExpression='SET #snapshot = :snapshot, #snapshot_id = :snapshot_id',
+                ConditionExpression='attribute_exists(#name)',
+                ExpressionAttributeNames={'#snapshot': 'snapshot', '#snapshot_id': 'snapshot_id', '#name': 'name'},
+                ExpressionAttributeValues={':snapshot': snapshot, ':snapshot_id': snapshot_id},
+            )
+        except Exception as e:
+            if hasattr(e, 'response') and 'Error' in e.response:
+                if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                    return False
+                logger.error(e.response['Error']['Message'])
+                return None
+            else:
+                logger.error(f"Unknown exception raised: {e}")
+                return None
+        return True
+
+    def fetch_profile_snapshot(self, profile_name):
+        try:
+            r = self._get_profile_item(
+                profile_name,
+                ProjectionExpression='#snapshot',
+                ExpressionAttributeNames={'#snapshot': 'snapshot'},
+            )
+        except Exception as e:
+            if hasattr(e, 'response') and 'Error' in e.response:
+                logger.error(e.response['Error']['Message'])
+                return None
+            else:
+                logger.error(f"Unknown exception raised: {e}")
+                return None
+
+        return r.get('Item', {}).get('snapshot')
+
+    def fetch_profile_snapshot_id(self, profile_name):
+        # snapshots are large, checking the ID of the current one is a single small read
+        try:
+            r = self._get_profile_item(
+                profile_name,
+                ProjectionExpression='#name, #snapshot_id',
+                ExpressionAttributeNames={'#name': 'name', '#snapshot_id': 'snapshot_id'},
+                ConsistentRead=True,
+            )
+        except Exception as e:
+            if hasattr(e, 'response') and 'Error' in e.response:
+                logger.error(e.response['Error']['Message'])
+                return None
+            else:
+                logger.error(f"Unknown exception raised: {e}")
+                return None
+
+        if 'Item' not in r:
+            return False
+        return r['Item'].get('snapshot_id', '')
+
+    def delete_profile_snapshot(self, profile_name):
+        try:
+            self.table.update_item(
+                Key=self._profile_key(profile_name, self._get_writable_shards()),
+                UpdateExpression='REMOVE #snapshot, #snapshot_id',
+                ConditionExpression='attribute_exists(#name)',
+                ExpressionAttributeNames={'#snapshot': 'snapshot', '#snapshot_id': 'snapshot_id', '#name': 'name'},
+            )
+        except Exception as e:
+            if hasattr(e, 'response') and 'Error' in e.response:
+                if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                    return True
+                logger.error(e.response['Error']['Message'])
+                return False
+            else:
+                logger.error(f"Unknown exception raised: {e}")
+                return False
+        return True
@@ -0,0 +1,174 @@
+import json
+import logging
+import os
+import re
+import time
+
+import boto3
+
+from . import consts, utils
+
+logger = logging.getLogger()
+
+IMAGE_URI_PATTERN = re.compile(r'^([0-9]+)\.dkr\.ecr\.([^.]+)\.amazonaws\.com/([^:@]+)(?::([^@]+))?(?:@(sha256:[0-9a-f]+))?$')
+
+# BatchGetImage accepts at most 100 image IDs
+BATCH_SIZE = 100
+
+
+def parse_image_uri(image_uri: str):
+    match = IMAGE_URI_PATTERN.match(image_uri)
+    if match is None:
+        return None
+
+    registry_id, region, repository_name, tag, digest = match.groups()
+    return {
+        'registry_id': registry_id,
+        'region': region,
+        'repository_name': repository_name,
+        'tag': tag,
+        'digest': digest,
+    }
+
+
+def digest_image_uri(image: dict, digest: str):
+    return f"{image['registry_id']}.dkr.ecr.{image['region']}.amazonaws.com/{image['repository_name']}@{digest}"
+
+
+class ImageResolver:
+    """
+    Resolves ECR image tags to digest pinned image URIs.
+    Results (including missing images) are cached locally for a short time,
+    so repeated deploys of the same tag skip the ECR lookup.
+    """
+
+    def __init__(self, cache_path: str = consts.DEFAULT_IMAGE_CACHE_PATH,
+                 ttl: float = consts.DEFAULT_IMAGE_CACHE_TTL,
+                 negative_ttl: float = consts.DEFAULT_IMAGE_NEGATIVE_CACHE_TTL,
+                 session: boto3.session.Session = None):
+        self.cache_path = os.path.expanduser(cache_path) if cache_path else None
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+
+        self.session = session or boto3.session.Session()
+        self.clients = {}
+
+    def _client(self, region):
+        if region not in self.clients:
+            self.clients[region] = self.session.client('ecr', region_name=region)
+        return self.clients[region]
+
+    def _load_cache(self):
+        if self.cache_path is None:
+            return {}
+
+        try:
+            with open(self.cache_path, mode='r') as f:
+                cache = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        except OSError as e:
+            logger.warning(f"Failed to read image cache {self.cache_path}: {e}")
+            return {}
+
+        now = time.time()
+        return {k: v for k, v in cache.items() if v['expires_at'] > now}
+
+    def _save_cache(self, cache):
+        if self.cache_path is None:
+            return
+
+        # the cache is an optimization only, resolving works without it
+        try:
+            utils.write_file_atomic(self.cache_path, json.dumps(cache))
+        except OSError as e:
+            logger.warning(f"Failed to write image cache {self.cache_path}: {e}")
+
+    def _fetch_digests(self, image: dict, tags: list):
+        digests = {}
+        client = self._client(image['region'])
+
+        for i in range(0, len(tags), BATCH_SIZE):
+            r = client.batch_get_image(
+                registryId=image['registry_id'],
+                repositoryName=image['repository_name'],
+                imageIds=[{'imageTag': tag} for tag in tags[i:i + BATCH_SIZE]],
+            )
+            logger.debug(f"Response from ECR: {r}")
+
+            for found in r['images']:
+                digests[found['imageId']['imageTag']] = found['imageId']['imageDigest']
+
+        return digests
+
+    def resolve(self, image_uris: list):
+        """
+        Returns a dict of image URI -> digest pinned image URI,
+        None for images that do not exist or are not ECR image URIs.
+        """
+        resolved = {}
+        cache = self._load_cache()
+        now = time.time()
+
+        # (registry, region, repository) -> tags to look up
+        lookups = {}
+
+        for image_uri in image_uris:
+            image = parse_image_uri(image_uri)
+            if image is None:
+                logger.error(f"{image_uri} is not an ECR image URI")
+                resolved[image_uri] = None
+                continue
+
+            if image['digest'] is not None:
+                resolved[image_uri] = digest_image_uri(image, image['digest'])
+                continue
+
+            if image_uri in cache:
+                digest = cache[image_uri]['digest']
+                if digest:
+                    logger.info(f"Image {image_uri} found in local cache")
+                    resolved[image_uri] = digest_image_uri(image, digest)
+                else:
+                    logger.error(f"Image {image_uri} not found (cached)")
+                    resolved[image_uri] = None
+                continue
+
+            repository = (image['registry_id'], image['region'], image['repository_name'])
+            lookups.setdefault(repository, []).append((image_uri, image))
+
+        for repository, images in lookups.items():
+            tags = sorted(set(image['tag'] or 'latest' for _, image in images))
+            logger.info(f"Resolving {len(tags)} tags in repository {repository[2]} (registry {repository[0]})")
+
+            try:
+                digests = self._fetch_digests(images[0][1], tags)
+            except Exception as e:
+                if hasattr(e, 'response') and 'Error' in e.response:
+                    logger.error(e.response['Error']['Message'])
+                else:
+                    logger.error(f"Unknown exception raised: {e}")
+
+                # errors are not cached
+                for image_uri, _ in images:
+                    resolved[image_uri] = None
+                continue
+
+            for image_uri, image in images:
+                digest = digests.get(image['tag'] or 'latest')
+                cache[image_uri] = {
+                    'digest': digest,
+                    'expires_at': now + (self.ttl if digest else self.negative_ttl),
+                }
+
+                if digest:
+                    logger.info(f"Image {image_uri} exists, resolved to {digest}")
+                    resolved[image_uri] = digest_image_uri(image, digest)
+                else:
+                    logger.error(f"Image {image_uri} not found in registry/account {image['registry_id']}")
+                    resolved[image_uri] = None
+
+        if len(lookups) > 0:
+            self._save_cache(cache)
+
+        return resolved
@@ -0,0 +1,60 @@
+import logging
+
+from . import journal, lease, provision, snapshot
+
+logger = logging.getLogger()
+
+
+def create_environment(state, profile_name, name, image_uri, profile, lease_ttl, no_lease, no_snapshot=False,
+                       progress=None, resume=False):
+    """
+    Create environment or deploy image_uri (already resolved, see ecr.ImageResolver) to existent one
+    and save it to state. Returns provision.create_env result, None on error.
+    """
+    progress = progress or (lambda step: None)
+
+    def create(image_uri_to_deploy):
+        reference = None
+        if not no_snapshot:
+            progress('snapshot')
+            reference = snapshot.load(state, profile_name, profile)
+
+        create_journal = journal.Journal(state, profile_name, name, 'create',
+                                         {'image_uri': image_uri_to_deploy}, progress)
+        if not create_journal.start(resume):
+            return None
+
+        r = provision.create_env(name, image_uri_to_deploy, profile, reference, create_journal)
+
+        def put_environment_step():
+            status = state.put_environment(profile_name, r['name'], r['cname'], r['image_uri'])
+            if status is None:
+                raise ValueError(f"Failed to save environment {r['name']} to state")
+
+        create_journal.run('state', put_environment_step)
+        create_journal.finish()
+        return r
+
+    if no_lease:
+        return create(image_uri)
+
+    progress('lease')
+    return lease.run_with_lease(state, profile_name, name, image_uri, lease_ttl, create)
+
+
+def delete_environment(state, profile_name, name, profile, resume=False):
+    """Delete environment resources and remove it from state. Returns provision.delete_env result, None on error"""
+    delete_journal = journal.Journal(state, profile_name, name, 'delete', {})
+    if not delete_journal.start(resume):
+        return None
+
+    r = provision.delete_env(name, profile, delete_journal)
+
+    def delete_environment_step():
+        status = state.delete_environment(profile_name, r['name'])
+        if status is None:
+            raise ValueError(f"Failed to delete environment {r['name']} from state")
+
+    delete_journal.run('state', delete_environment_step)
+    delete_journal.finish()
+    return r
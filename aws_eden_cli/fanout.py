@@ -0,0 +1,127 @@
+import collections
+import concurrent.futures
+import logging
+
+import boto3
+
+from . import consts, dynamodb
+
+logger = logging.getLogger()
+
+
+def parse_targets(targets: str):
+    # region[:profile][:table],...
+    parsed = []
+
+    for target in targets.split(','):
+        target = target.strip()
+        if not target:
+            continue
+
+        parts = target.split(':')
+        if len(parts) > 3 or not parts[0]:
+            logger.error(f"Invalid target {target}, expected region[:profile][:table]")
+            return None
+
+        parts += [''] * (3 - len(parts))
+        region, aws_profile, table_name = parts
+
+        parsed.append({
+            'source': target,
+            'region': region,
+            'aws_profile': aws_profile or None,
+            'table_name': table_name or consts.DEFAULT_TABLE_NAME,
+        })
+
+    if len(parsed) == 0:
+        logger.error("No targets given")
+        return None
+
+    # results are keyed by target, and the same table must not be listed twice (e.g. us-east-1 and us-east-1::eden)
+    tables = collections.Counter((t['region'], t['aws_profile'], t['table_name']) for t in parsed)
+    duplicates = [t['source'] for t in parsed if tables[(t['region'], t['aws_profile'], t['table_name'])] > 1]
+    if len(duplicates) > 0:
+        logger.error(f"Targets given more than once: {', '.join(duplicates)}")
+        return None
+
+    return parsed
+
+
+def create_target_state(target: dict):
+    # every target gets its own session (credentials, region) and connection pool
+    session = boto3.session.Session(
+        region_name=target['region'],
+        profile_name=target['aws_profile'],
+    )
+    return dynamodb.DynamoDBState(target['table_name'], session=session)
+
+
+def fan_out(targets: list, fetch, create_state=create_target_state):
+    """
+    Call fetch(create_state(target)) for every target concurrently.
+    Returns a dict of target source -> result, failed targets have None results.
+    """
+
+    def fetch_target(target):
+        try:
+            return fetch(create_state(target))
+        except Exception as e:
+            logger.error(f"Unknown exception raised for target {target['source']}: {e}")
+            return None
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(targets)) as executor:
+        results = dict(zip(
+            [target['source'] for target in targets],
+            executor.map(fetch_target, targets),
+        ))
+
+    for source, result in results.items():
+        if result is None:
+            logger.warning(f"Failed to fetch from target {source}")
+
+    return results
+
+
+def fetch_all_environments(targets: list, create_state=create_target_state):
+    environments = {}
+
+    def fetch(state):
+        if not state.check_remote_state_table():
+            return None
+        return state.fetch_all_environments()
+
+    results = fan_out(targets, fetch, create_state)
+
+    for source, result in results.items():
+        if result is None:
+            continue
+
+        for profile_name, profile_environments in result.items():
+            for environment in profile_environments:
+                environment['source'] = source
+                environments.setdefault(profile_name, []).append(environment)
+
+    failed = [source for source, result in results.items() if result is None]
+    return environments, failed
+
+
+def fetch_all_profiles(targets: list, create_state=create_target_state):
+    # profile name -> list of (source, profile)
+    profiles = {}
+
+    def fetch(state):
+        if not state.check_remote_state_table():
+            return None
+        return state.fetch_all_profiles()
+
+    results = fan_out(targets, fetch, create_state)
+
+    for source, result in results.items():
+        if result is None:
+            continue
+
+        for profile_name, profile in result.items():
+            profiles.setdefault(profile_name, []).append((source, profile))
+
+    failed = [source for source, result in results.items() if result is None]
+    return profiles, failed
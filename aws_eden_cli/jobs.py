@@ -0,0 +1,175 @@
+import concurrent.futures
+import datetime
+import decimal
+import json
+import logging
+import time
+import uuid
+
+from . import lease
+from .state import job_key, JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED, JOB_FAILED, JOB_KIND, JOB_KIND_QUEUED
+
+logger = logging.getLogger()
+
+STEP_STARTED = 'started'
+STEP_COMPLETED = 'completed'
+STEP_FAILED = 'failed'
+
+
+def now_isoformat():
+    return datetime.datetime.now().isoformat()
+
+
+def create_job(operation, profile_name, name, parameters: dict, profile: dict):
+    # profile is stored with the job, so workers do not need local configuration
+    return {
+        **job_key(uuid.uuid4().hex),
+        'kind': JOB_KIND_QUEUED,
+        'last_updated': decimal.Decimal(str(time.time())),
+        'status': JOB_QUEUED,
+        'operation': operation,
+        'profile_name': profile_name,
+        'environment_name': name,
+        'parameters': json.dumps(parameters),
+        'profile': json.dumps(profile),
+        'steps': [],
+        'created_at': now_isoformat(),
+    }
+
+
+class JobProgress:
+    def __init__(self, state, job_id, worker):
+        self.state = state
+        self.job_id = job_id
+        self.worker = worker
+        self.steps = []
+
+    def _finish_step(self, status):
+        if len(self.steps) > 0 and self.steps[-1]['status'] == STEP_STARTED:
+            self.steps[-1]['status'] = status
+            self.steps[-1]['finished_at'] = now_isoformat()
+
+    def __call__(self, step):
+        self._finish_step(STEP_COMPLETED)
+        self.steps.append({
+            'step': step,
+            'status': STEP_STARTED,
+            'started_at': now_isoformat(),
+        })
+        logger.debug(f"Job {self.job_id}: {step}")
+        self.state.update_job(self.job_id, {'steps': self.steps})
+
+    def _finish(self, attributes):
+        # only the worker holding the claim records the outcome, the job may be run by another worker by now
+        if not self.state.finish_job(self.job_id, self.worker, {
+            'steps': self.steps,
+            'kind': JOB_KIND,
+            'finished_at': now_isoformat(),
+            **attributes,
+        }):
+            logger.warning(f"Lost claim of job {self.job_id}, outcome was not recorded")
+
+    def succeed(self, result):
+        self._finish_step(STEP_COMPLETED)
+        self._finish({
+            'status': JOB_SUCCEEDED,
+            'result': json.dumps(result),
+        })
+
+    def fail(self, error):
+        self._finish_step(STEP_FAILED)
+        self._finish({
+            'status': JOB_FAILED,
+            'error': error,
+        })
+
+
+def run_job(state, job, execute, worker, ttl):
+    job_id = job['name']
+    progress = JobProgress(state, job_id, worker)
+
+    if job['status'] == JOB_RUNNING:
+        logger.warning(f"Claim of job {job_id} by worker {job['worker']} expired, running it again")
+
+    logger.info(f"Running job {job_id}: {job['operation']} {job['environment_name']} "
+                f"(profile {job['profile_name']})")
+
+    # claim is renewed while the job runs, jobs of crashed workers are requeued when it expires
+    heartbeat = lease.Heartbeat(lambda: state.renew_job(job_id, worker, ttl), ttl,
+                                f"claim of job {job_id}, it may be run by another worker")
+    heartbeat.start()
+
+    try:
+        result = execute(job, progress)
+    except Exception as e:
+        heartbeat.stop()
+        logger.error(f"Job {job_id} failed: {e}")
+        progress.fail(str(e))
+        return
+
+    heartbeat.stop()
+
+    if result is None:
+        logger.error(f"Job {job_id} failed")
+        progress.fail("Job failed, see worker logs for details")
+        return
+
+    logger.info(f"Job {job_id} succeeded")
+    progress.succeed(result)
+
+
+def run_worker(state, execute, concurrency, poll_interval, ttl, once=False):
+    """
+    Claim queued jobs and run execute(job, progress) for them,
+    at most concurrency jobs at a time.
+    Claims expire ttl seconds after the last heartbeat, then the job is run again by any worker.
+    With once, return when the queue is empty and all claimed jobs are finished.
+    """
+    worker = lease.create_holder_id()
+    running = set()
+
+    logger.info(f"Worker {worker} started, concurrency {concurrency}")
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while True:
+            running = {future for future in running if not future.done()}
+
+            jobs = []
+            if len(running) < concurrency:
+                jobs = state.fetch_queued_jobs(concurrency - len(running)) or []
+
+            for job in jobs:
+                if not state.claim_job(job['name'], worker, ttl):
+                    logger.debug(f"Job {job['name']} was claimed by another worker")
+                    continue
+
+                running.add(executor.submit(run_job, state, job, execute, worker, ttl))
+
+            if once and len(jobs) == 0 and len(running) == 0:
+                return
+
+            if len(running) > 0:
+                concurrent.futures.wait(running, timeout=poll_interval,
+                                        return_when=concurrent.futures.FIRST_COMPLETED)
+            else:
+                time.sleep(poll_interval)
+
+
+def wait(state, job_id, timeout, poll_interval):
+    """Returns finished job, None on timeout or if job does not exist"""
+    deadline = time.time() + timeout
+
+    while True:
+        job = state.fetch_job(job_id)
+        if job is None:
+            logger.error(f"Job {job_id} not found")
+            return None
+
+        if job['status'] in (JOB_SUCCEEDED, JOB_FAILED):
+            return job
+
+        if time.time() >= deadline:
+            logger.error(f"Timed out waiting for job {job_id}, last status: {job['status']}")
+            return None
+
+        time.sleep(poll_interval)
@@ -0,0 +1,113 @@
+import json
+import logging
+
+from .jobs import now_isoformat
+from .state import JOURNAL_RUNNING, JOURNAL_SUCCEEDED, JOURNAL_FAILED
+
+logger = logging.getLogger()
+
+STEP_SUCCEEDED = 'succeeded'
+STEP_FAILED = 'failed'
+
+
+class Journal:
+    """
+    Records outcome and resource identifiers of every create/delete step in the state table.
+    A resumed journal skips steps that succeeded in the previous run of the same operation,
+    after checking their resources with verify (if given).
+    """
+
+    def __init__(self, state, profile_name, name, operation, parameters: dict, progress=None):
+        self.state = state
+        self.profile_name = profile_name
+        self.name = name
+        self.operation = operation
+        self.parameters = json.dumps(parameters, sort_keys=True)
+        self.progress = progress or (lambda step: None)
+        self.steps = {}
+
+    def start(self, resume=False):
+        previous = None
+        if resume:
+            previous = self.state.fetch_journal(self.profile_name, self.name)
+
+            if previous is None:
+                logger.info(f"No journal found for {self.name}, starting from the beginning")
+            elif previous['operation'] != self.operation or previous['parameters'] != self.parameters:
+                logger.warning(f"Journal of {self.name} is for {previous['operation']} "
+                               f"with different parameters, starting from the beginning")
+                previous = None
+            elif previous['status'] == JOURNAL_SUCCEEDED:
+                logger.info(f"Previous {self.operation} of {self.name} succeeded, starting from the beginning")
+                previous = None
+
+        if previous is not None:
+            self.steps = previous['steps']
+            completed = [step for step, record in self.steps.items() if record['status'] == STEP_SUCCEEDED]
+            logger.info(f"Resuming {self.operation} of {self.name}, completed steps: {', '.join(completed)}")
+
+        return self.state.put_journal(self.profile_name, self.name, {
+            'operation': self.operation,
+            'parameters': self.parameters,
+            'status': JOURNAL_RUNNING,
+            'steps': self.steps,
+            'started_at': now_isoformat(),
+        })
+
+    def run(self, step, action, verify=None):
+        """Run action() unless step already succeeded, returns resource identifiers dict"""
+        self.progress(step)
+
+        record = self.steps.get(step)
+        if record is not None and record['status'] == STEP_SUCCEEDED:
+            resources = record['resources']
+
+            try:
+                verified = verify is None or verify(resources)
+            except Exception as e:
+                logger.debug(e)
+                verified = False
+
+            if verified:
+                logger.info(f"Step {step} already completed, skipping")
+                return resources
+
+            logger.info(f"Resources of completed step {step} not found, running step again")
+
+        try:
+            resources = action() or {}
+        except Exception as e:
+            logger.error(f"Step {step} of {self.operation} {self.name} failed, "
+                         f"run again with --resume to continue from this step")
+            self.steps[step] = {
+                'status': STEP_FAILED,
+                'error': str(e),
+                'finished_at': now_isoformat(),
+            }
+            self.state.update_journal(self.profile_name, self.name, {
+                'steps': self.steps,
+                'status': JOURNAL_FAILED,
+            })
+            raise
+
+        self.steps[step] = {
+            'status': STEP_SUCCEEDED,
+            'resources': resources,
+            'finished_at': now_isoformat(),
+        }
+        self.state.update_journal(self.profile_name, self.name, {'steps': self.steps})
+
+        return resources
+
+    def finish(self):
+        self.state.update_journal(self.profile_name, self.name, {
+            'status': JOURNAL_SUCCEEDED,
+            'finished_at': now_isoformat(),
+        })
+
+
+class NullJournal:
+    """Runs every step without recording it"""
+
+    def run(self, step, action, verify=None):
+        return action() or {}
@@ -0,0 +1,136 @@
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+
+from .state import LEASE_RUNNING, LEASE_SUCCEEDED, LEASE_FAILED
+
+logger = logging.getLogger()
+
+POLL_INTERVAL = 2
+
+
+def create_holder_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class Heartbeat(threading.Thread):
+    """Call renew() every ttl / 3 seconds until stopped, or until renew returns False"""
+
+    def __init__(self, renew, ttl, description):
+        super().__init__(daemon=True)
+
+        self.renew = renew
+        self.ttl = ttl
+        self.description = description
+
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.ttl / 3):
+            if not self.renew():
+                logger.warning(f"Lost {self.description}")
+                return
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def hold(state, profile_name, name, holder, image_uri, ttl, create):
+    heartbeat = Heartbeat(lambda: state.renew_lease(profile_name, name, holder, ttl), ttl,
+                          f"lease for environment {name} in profile {profile_name}")
+    heartbeat.start()
+
+    try:
+        while True:
+            try:
+                result = create(image_uri)
+            except Exception:
+                state.release_lease(profile_name, name, holder, LEASE_FAILED, image_uri, None)
+                raise
+
+            if state.release_lease(profile_name, name, holder, LEASE_SUCCEEDED, image_uri, result):
+                return result
+
+            # release fails if other jobs requested a newer image meanwhile (or lease was lost)
+            lease = state.fetch_lease(profile_name, name)
+            if lease is None or lease['holder'] != holder:
+                logger.warning(f"Lease for environment {name} was taken over by another job")
+                return result
+
+            logger.info(f"Newer image {lease['image_uri']} was requested during deployment, redeploying")
+            image_uri = lease['image_uri']
+
+    finally:
+        heartbeat.stop()
+
+
+def follow(state, profile_name, name):
+    """
+    Wait for the running holder to finish.
+    Returns the finished lease, or None if the lease expired or could not be read.
+    """
+    while True:
+        lease = state.fetch_lease(profile_name, name)
+        if lease is None:
+            return None
+
+        if lease['status'] != LEASE_RUNNING:
+            return lease
+
+        if float(lease['expires_at']) < time.time():
+            logger.warning(f"Lease for environment {name} held by {lease['holder']} expired")
+            return None
+
+        time.sleep(POLL_INTERVAL)
+
+
+def run_with_lease(state, profile_name, name, image_uri, ttl, create):
+    """
+    Run create(image_uri) at most once at a time for profile_name and name.
+    Concurrent callers wait for the running job and coalesce onto the newest image URI.
+    Returns result of create (possibly run by another job), None on error.
+    """
+    holder = create_holder_id()
+
+    while True:
+        acquired = state.acquire_lease(profile_name, name, holder, image_uri, ttl)
+        if acquired is None:
+            return None
+
+        if acquired:
+            logger.debug(f"Acquired lease for environment {name} in profile {profile_name} as {holder}")
+            return hold(state, profile_name, name, holder, image_uri, ttl, create)
+
+        # holder will deploy our image after its current deployment,
+        # if it has finished meanwhile, try to acquire again
+        if not state.request_lease_image(profile_name, name, image_uri):
+            continue
+
+        logger.info(f"Environment {name} is being deployed by another job, "
+                    f"requested deployment of {image_uri} and waiting for result")
+
+        lease = follow(state, profile_name, name)
+        if lease is None:
+            # holder is gone, try to take over
+            continue
+
+        if lease['status'] == LEASE_FAILED:
+            if lease['deployed_image_uri'] == image_uri:
+                logger.error(f"Deployment of environment {name} by another job failed")
+                return None
+
+            # holder failed before it got to our image, deploy it ourselves
+            logger.warning(f"Deployment of environment {name} with image {lease['deployed_image_uri']} "
+                           f"by another job failed, retrying with {image_uri}")
+            continue
+
+        if lease['deployed_image_uri'] != image_uri:
+            logger.info(f"Environment {name} was deployed with newer image {lease['deployed_image_uri']} "
+                        f"by another job")
+
+        return json.loads(lease['result'])
@@ -0,0 +1,245 @@
+import datetime
+import decimal
+import json
+import logging
+import threading
+import time
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+from .state import LocalState, EXPORTED_KINDS, JOB_KIND_QUEUED, JOB_KIND_RUNNING
+
+logger = logging.getLogger()
+
+
+class MemoryState(LocalState):
+    # tables are shared between instances within one process,
+    # so that separately created states see the same data,
+    # each table is stored with its own lock: table name -> (items, lock)
+    _tables = {}
+    _tables_lock = threading.Lock()
+
+    def __init__(self, table_name: str):
+        self.table_name = table_name
+
+        self.serializer = TypeSerializer()
+        self.deserializer = TypeDeserializer()
+
+    @property
+    def items(self) -> dict:
+        # (type, name) -> item
+        return MemoryState._tables[self.table_name][0]
+
+    @property
+    def lock(self):
+        # read-modify-write must be exclusive across all instances of the table
+        return MemoryState._tables[self.table_name][1]
+
+    def get_table_name(self):
+        return self.table_name
+
+    def check_remote_state_table(self, auto_create: bool = False):
+        with MemoryState._tables_lock:
+            if self.table_name not in MemoryState._tables:
+                if auto_create:
+                    logger.info(f"In-memory state table {self.table_name} does not exist, creating...")
+                    MemoryState._tables[self.table_name] = ({}, threading.RLock())
+                else:
+                    logger.error(f"In-memory state table {self.table_name} does not exist")
+                    return False
+
+        return True
+
+    def _check_table(self):
+        if self.table_name not in MemoryState._tables:
+            logger.error("eden table not found, please create table with "
+                         "\"eden config push\" or \"eden create\" first")
+            return False
+        return True
+
+    def _get_item(self, key: dict, missing=None):
+        if not self._check_table():
+            return None
+
+        with self.lock:
+            item = self.items.get((key['type'], key['name']))
+            return dict(item) if item is not None else missing
+
+    def _update_item(self, key: dict, update):
+        if not self._check_table():
+            return None
+
+        with self.lock:
+            item = self.items.get((key['type'], key['name']))
+            item = update(dict(item) if item is not None else None)
+            if item is None:
+                return False
+
+            self.items[(key['type'], key['name'])] = item
+        return True
+
+    def delete_profile(self, profile_name):
+        if not self._check_table():
+            return False
+
+        with self.lock:
+            self.items.pop(('_profile', profile_name), None)
+        return True
+
+    def put_profile(self, profile_name, profile_dict):
+        if not self._check_table():
+            return False
+
+        with self.lock:
+            self.items[('_profile', profile_name)] = {
+                'type': '_profile',
+                'name': profile_name,
+                'profile': json.dumps(profile_dict),
+                'kind': 'profile',
+            }
+        return True
+
+    def fetch_all_environments(self, consistent: bool = False):
+        if not self._check_table():
+            return None
+
+        environments = {}
+
+        with self.lock:
+            items = [dict(item) for item in self.items.values()]
+
+        for item in items:
+            env_type: str = item.pop('type')
+            if item.get('kind') != 'environment':
+                continue
+
+            if env_type not in environments:
+                environments[env_type] = []
+
+            environments[env_type].append(item)
+
+        return environments
+
+    def fetch_all_profiles(self):
+        if not self._check_table():
+            return None
+
+        with self.lock:
+            return {
+                item['name']: item['profile']
+                for (env_type, _), item in self.items.items() if env_type == '_profile'
+            }
+
+    def fetch_profile(self, profile_name):
+        if not self._check_table():
+            return None
+
+        with self.lock:
+            item = self.items.get(('_profile', profile_name))
+
+        if item is None:
+            logger.warning(f"Profile {profile_name} not found in remote table!")
+            return None
+        elif 'profile' not in item:
+            logger.warning(f"Profile {profile_name} does not contain any parameters!")
+            return None
+
+        try:
+            profile_json = json.loads(item['profile'])
+        except json.JSONDecodeError as e:
+            logger.error(f"JSON decode error: {e}")
+            return None
+
+        return profile_json
+
+    def put_environment(self, profile_name, name, cname, image_uri=None):
+        if not self._check_table():
+            return None
+
+        item = {
+            'type': profile_name,
+            'name': name,
+            'last_updated': decimal.Decimal(datetime.datetime.now().timestamp()),
+            'endpoint': cname,
+            'kind': 'environment',
+        }
+        if image_uri is not None:
+            item['image_uri'] = image_uri
+
+        with self.lock:
+            self.items[(profile_name, name)] = item
+        return item
+
+    def delete_environment(self, profile_name, name):
+        if not self._check_table():
+            return None
+
+        with self.lock:
+            return self.items.pop((profile_name, name), {})
+
+    def _environments(self):
+        with self.lock:
+            return [item for item in self.items.values() if item.get('kind') == 'environment']
+
+    def count_environments_by_profile(self):
+        if not self._check_table():
+            return None
+
+        counts = {}
+        for item in self._environments():
+            counts[item['type']] = counts.get(item['type'], 0) + 1
+        return counts
+
+    def count_environments_updated_between(self, start: float, end: float):
+        if not self._check_table():
+            return None
+
+        return len([item for item in self._environments() if start < item['last_updated'] <= end])
+
+    def fetch_oldest_environments(self, limit: int, profile_counts: dict):
+        if not self._check_table():
+            return None
+
+        oldest = {}
+        for item in sorted(self._environments(), key=lambda i: i['last_updated']):
+            environments = oldest.setdefault(item['type'], [])
+            if len(environments) < limit:
+                environments.append({
+                    'name': item['name'],
+                    'last_updated': float(item['last_updated']),
+                })
+        return oldest
+
+    def export_items(self, segments: int = 4):
+        if not self._check_table():
+            return
+
+        with self.lock:
+            items = [item for item in self.items.values() if item.get('kind') in EXPORTED_KINDS]
+
+        for item in items:
+            yield {k: self.serializer.serialize(v) for k, v in item.items()}
+
+    def batch_write_items(self, items: list, max_retries: int = 8):
+        if not self._check_table():
+            return False
+
+        with self.lock:
+            for item in items:
+                item = {k: self.deserializer.deserialize(v) for k, v in item.items()}
+                self.items[(item['type'], item['name'])] = item
+        return True
+
+    def fetch_queued_jobs(self, limit: int):
+        if not self._check_table():
+            return None
+
+        now = time.time()
+
+        with self.lock:
+            queued = [dict(item) for item in self.items.values() if item.get('kind') == JOB_KIND_QUEUED]
+            expired = [dict(item) for item in self.items.values()
+                       if item.get('kind') == JOB_KIND_RUNNING and item['last_updated'] < now]
+
+        return (sorted(queued, key=lambda job: job['last_updated']) +
+                sorted(expired, key=lambda job: job['last_updated']))[:limit]
@@ -0,0 +1,453 @@
+import logging
+import threading
+
+from aws_eden_core import methods
+
+from .journal import NullJournal
+
+logger = logging.getLogger()
+
+# endpoints file is downloaded to and uploaded from the same local path (read-modify-write),
+# so concurrent updates within one process (worker, EdenClient) are serialized
+ENDPOINTS_LOCK = threading.Lock()
+
+# new listener rules get the highest priority + 1, concurrent creates would pick the same priority
+LISTENER_RULE_LOCK = threading.Lock()
+
+
+def describe_reference(profile):
+    """Describe reference service, its task definition and target group, master ALB and dynamic zone"""
+    target_alb_arn: str = profile['master_alb_arn']
+    target_alb = methods.describe_alb(target_alb_arn)
+    if not target_alb:
+        raise ValueError(f"Load balancer not found: {target_alb_arn}")
+
+    dynamic_zone_name = methods.get_zone_name(profile['dynamic_zone_id'])
+
+    cluster_name: str = profile['target_cluster']
+    reference_service_arn: str = profile['reference_service_arn']
+
+    reference_service: dict = methods.describe_service(
+        cluster_name,
+        reference_service_arn,
+    )
+    if not reference_service:
+        raise ValueError(f"Reference service not found: {reference_service_arn}")
+
+    logger.info(f"Retrieved reference service {reference_service_arn}")
+    logger.debug(reference_service)
+
+    reference_task_definition: dict = methods.ecs.describe_task_definition(
+        taskDefinition=reference_service['taskDefinition'],
+    )['taskDefinition']
+    logger.info(f"Retrieved reference task definition from {reference_service['taskDefinition']}")
+    logger.debug(reference_task_definition)
+
+    reference_target_group_arn: str = reference_service['loadBalancers'][0]['targetGroupArn']
+    reference_target_group = methods.describe_target_group(reference_target_group_arn)
+    if not reference_target_group:
+        raise ValueError(f"No reference target groups for ARN: {reference_target_group_arn}")
+
+    logger.info(f"Retrieved reference target group: {reference_target_group_arn}")
+    logger.debug(reference_target_group)
+
+    # events and deployments are not needed for cloning and can be large
+    reference_service = {k: v for k, v in reference_service.items() if k not in ('events', 'deployments')}
+
+    return {
+        'load_balancer': target_alb,
+        'zone_name': dynamic_zone_name,
+        'service': reference_service,
+        'task_definition': reference_task_definition,
+        'target_group': reference_target_group,
+    }
+
+
+def create_task_definition(reference_task_definition: dict, target_container_name: str,
+                           resource_name: str, image_uri: str):
+    # same as aws_eden_core.methods.create_task_definition, without describing reference task definition
+    family = methods.sanitize_string(resource_name)
+    container_definitions = [dict(definition) for definition in reference_task_definition['containerDefinitions']]
+
+    target_updated = False
+    for definition in container_definitions:
+        if definition['name'] == target_container_name:
+            definition['image'] = image_uri
+            target_updated = True
+
+    if not target_updated:
+        raise ValueError(f"Container with name {target_container_name} not found in "
+                         f"reference task definition: {reference_task_definition}")
+
+    kwargs = {
+        'family': family,
+        'taskRoleArn': reference_task_definition['taskRoleArn'],
+        'networkMode': reference_task_definition['networkMode'],
+        'containerDefinitions': container_definitions,
+    }
+
+    optional_keys = [
+        'executionRoleArn',
+        'volumes',
+        'placementConstraints',
+        'requiresCompatibilities',
+        'cpu',
+        'memory',
+        'tags',
+        'pidMode',
+        'ipcMode',
+        'proxyConfiguration',
+    ]
+
+    for key in optional_keys:
+        if key in reference_task_definition:
+            kwargs[key] = reference_task_definition[key]
+
+    logger.debug(kwargs)
+    response = methods.ecs.register_task_definition(**kwargs)
+    logger.info(f"Registered new task definition: {response['taskDefinition']['taskDefinitionArn']}")
+    logger.debug(response)
+
+    return response
+
+
+def create_target_group(reference_target_group: dict, resource_name: str):
+    # same as aws_eden_core.methods.create_target_group, without describing reference target group
+    clean_resource_name = methods.sanitize_string_alphanum_hyphen(resource_name)
+
+    existing_target_group = None
+    try:
+        existing_target_group = methods.describe_target_group_name(clean_resource_name)
+
+    except methods.elbv2.exceptions.TargetGroupNotFoundException as e:
+        logger.info(f"Existing target group {clean_resource_name} not found, will create new")
+        logger.debug(e)
+
+    if existing_target_group:
+        logger.info(f"Target group {clean_resource_name} already exists, skipping creation")
+        logger.debug(existing_target_group)
+        return existing_target_group['TargetGroupArn']
+
+    kwargs = {
+        'Name': clean_resource_name,
+        'Protocol': reference_target_group['Protocol'],
+        'Port': reference_target_group['Port'],
+        'VpcId': reference_target_group['VpcId'],
+        'HealthCheckProtocol': reference_target_group['HealthCheckProtocol'],
+        'HealthCheckPort': reference_target_group['HealthCheckPort'],
+        'HealthCheckPath': reference_target_group['HealthCheckPath'],
+        'HealthCheckIntervalSeconds': reference_target_group['HealthCheckIntervalSeconds'],
+        'HealthCheckTimeoutSeconds': reference_target_group['HealthCheckTimeoutSeconds'],
+        'HealthyThresholdCount': reference_target_group['HealthyThresholdCount'],
+        'UnhealthyThresholdCount': reference_target_group['UnhealthyThresholdCount'],
+        'Matcher': reference_target_group['Matcher'],
+        'TargetType': reference_target_group['TargetType'],
+    }
+
+    optional_keys = [
+        'HealthCheckEnabled',
+    ]
+
+    for key in optional_keys:
+        if key in reference_target_group:
+            kwargs[key] = reference_target_group[key]
+
+    response = methods.elbv2.create_target_group(**kwargs)
+    logger.debug(response)
+    target_group_arn = response['TargetGroups'][0]['TargetGroupArn']
+
+    logger.info(f"Created target group {target_group_arn}")
+
+    return target_group_arn
+
+
+def task_definition_active(resources):
+    response = methods.ecs.describe_task_definition(taskDefinition=resources['task_definition_arn'])
+    return response['taskDefinition']['status'] == 'ACTIVE'
+
+
+def target_group_exists(resources):
+    # raises TargetGroupNotFoundException for deleted target groups
+    methods.elbv2.describe_target_groups(TargetGroupArns=[resources['target_group_arn']])
+    return True
+
+
+def listener_rule_exists(resources):
+    if 'rule_arn' not in resources:
+        return True
+
+    # raises RuleNotFoundException for deleted rules
+    methods.elbv2.describe_rules(RuleArns=[resources['rule_arn']])
+    return True
+
+
+def record_exists_in_zone(zone_id, record_name):
+    dotted_record_name = record_name if record_name.endswith('.') else f"{record_name}."
+
+    response = methods.route53.list_resource_record_sets(
+        HostedZoneId=zone_id,
+        StartRecordName=dotted_record_name,
+        StartRecordType='A',
+        MaxItems='1',
+    )
+    records = response['ResourceRecordSets']
+    return len(records) > 0 and records[0]['Name'] == dotted_record_name and records[0]['Type'] == 'A'
+
+
+def create_env(branch, image_uri, profile, reference=None, journal=None):
+    """
+    Same as aws_eden_core.methods.create_env,
+    but image_uri must already be resolved (see ecr.ImageResolver), so ECR is not queried again.
+    Digest pinned image URIs (repository@sha256:...) are accepted.
+    Reference resources are described unless given (see snapshot module).
+    Every step is recorded in journal if given (see journal module).
+    """
+    endpoints_s3_bucket_name: str = profile['endpoint_s3_bucket_name']
+    endpoints_s3_key: str = profile['endpoint_s3_key']
+    endpoints_update_key: str = profile['endpoint_update_key']
+    endpoint_name_prefix: str = profile['endpoint_name_prefix']
+    endpoint_type: str = profile['endpoint_env_type']
+    endpoint_name: str = f"{endpoint_name_prefix}-{branch}"
+
+    domain_name_prefix: str = profile['domain_name_prefix']
+    dynamic_zone_id: str = profile['dynamic_zone_id']
+
+    if reference is None:
+        reference = describe_reference(profile)
+
+    dynamic_zone_name = reference['zone_name']
+    subdomain_name = f"{methods.sanitize_string(domain_name_prefix)}-{methods.sanitize_string(branch)}"
+    dynamic_domain_name = f"{subdomain_name}.{dynamic_zone_name}"
+
+    resource_name_prefix: str = profile['name_prefix']
+    resource_name: str = f"{resource_name_prefix}-{branch}"
+
+    cluster_name: str = profile['target_cluster']
+
+    target_alb_arn: str = profile['master_alb_arn']
+    target_alb: dict = reference['load_balancer']
+
+    reference_service: dict = reference['service']
+    target_container_name: str = reference_service['loadBalancers'][0]['containerName']
+
+    def create_task_definition_step():
+        response = create_task_definition(
+            reference['task_definition'],
+            target_container_name,
+            resource_name,
+            image_uri
+        )
+        return {'task_definition_arn': response['taskDefinition']['taskDefinitionArn']}
+
+    def create_target_group_step():
+        return {'target_group_arn': create_target_group(reference['target_group'], resource_name)}
+
+    def create_listener_rule_step():
+        with LISTENER_RULE_LOCK:
+            response = methods.create_alb_host_listener_rule(
+                target_alb_arn,
+                target_group_arn,
+                dynamic_domain_name
+            )
+        logger.debug(f"create alb host listener response: {response}")
+
+        # ARN is only known for newly created rules
+        if 'Rules' in response:
+            return {'rule_arn': response['Rules'][0]['RuleArn']}
+        return {}
+
+    def create_service_step():
+        existing_service = methods.describe_service(cluster_name, resource_name)
+        logger.debug(f"Looking for existing service named {resource_name} in cluster {cluster_name}: "
+                     f"{existing_service}")
+
+        if existing_service and existing_service['status'] == 'ACTIVE':
+            logger.info(f"ECS Service {resource_name} already exists, skipping creation")
+            logger.info(f"Will deploy task definition {new_task_definition_arn} "
+                        f"to service {resource_name}")
+
+            response = methods.update_service(
+                reference_service,
+                resource_name,
+                new_task_definition_arn,
+                cluster_name,
+            )
+
+            logger.info(f"Successfully deployed task definition {new_task_definition_arn} to "
+                        f"service {resource_name} in cluster {cluster_name}")
+            logger.debug(response)
+
+        else:
+            logger.info(f"ECS Service {resource_name} does not exist, will create new service")
+            response = methods.create_service(
+                reference_service,
+                resource_name,
+                new_task_definition_arn,
+                cluster_name,
+                target_group_arn,
+            )
+
+        return {'service_arn': response['service']['serviceArn']}
+
+    def create_record_step():
+        cname = methods.create_record(
+            dynamic_zone_id,
+            dynamic_domain_name,
+            target_alb['DNSName'],
+            target_alb['CanonicalHostedZoneId']
+        )
+        return {'cname': cname}
+
+    def endpoints_add_step():
+        with ENDPOINTS_LOCK:
+            methods.endpoints_add(
+                endpoints_s3_bucket_name,
+                endpoints_s3_key,
+                endpoint_name,
+                dynamic_domain_name,
+                endpoint_type,
+                endpoints_update_key,
+            )
+        return {'endpoint_name': endpoint_name}
+
+    def service_deployed(resources):
+        service = methods.describe_service(cluster_name, resources['service_arn'])
+        return service is not None and service['status'] == 'ACTIVE' and \
+            service['taskDefinition'] == new_task_definition_arn
+
+    def record_exists(resources):
+        return record_exists_in_zone(dynamic_zone_id, resources['cname'])
+
+    journal = journal or NullJournal()
+
+    new_task_definition_arn = journal.run('task_definition', create_task_definition_step,
+                                          task_definition_active)['task_definition_arn']
+    target_group_arn = journal.run('target_group', create_target_group_step,
+                                   target_group_exists)['target_group_arn']
+    journal.run('listener_rule', create_listener_rule_step, listener_rule_exists)
+    journal.run('service', create_service_step, service_deployed)
+    cname = journal.run('record', create_record_step, record_exists)['cname']
+    journal.run('endpoints', endpoints_add_step)
+
+    logger.info(f"Successfully finished creating environment {resource_name}")
+
+    return {
+        'name': resource_name,
+        'cname': cname,
+        'image_uri': image_uri,
+    }
+
+
+def delete_env(branch, profile, journal=None):
+    """
+    Same as aws_eden_core.methods.delete_env, split into journalled steps (see journal module).
+    Target group is deleted by the ARN found when deleting its listener rule.
+    """
+    endpoints_s3_bucket_name: str = profile['endpoint_s3_bucket_name']
+    endpoints_s3_key: str = profile['endpoint_s3_key']
+    endpoints_update_key: str = profile['endpoint_update_key']
+    endpoint_name_prefix: str = profile['endpoint_name_prefix']
+    endpoint_name: str = f"{endpoint_name_prefix}-{branch}"
+
+    domain_name_prefix: str = profile['domain_name_prefix']
+    dynamic_zone_id: str = profile['dynamic_zone_id']
+    dynamic_zone_name = methods.get_zone_name(dynamic_zone_id)
+    subdomain_name = f"{methods.sanitize_string(domain_name_prefix)}-{methods.sanitize_string(branch)}"
+    dynamic_domain_name = f"{subdomain_name}.{dynamic_zone_name}"
+
+    resource_name_prefix: str = profile['name_prefix']
+    resource_name: str = f"{resource_name_prefix}-{branch}"
+
+    cluster_name: str = profile['target_cluster']
+
+    target_alb_arn: str = profile['master_alb_arn']
+
+    def endpoints_delete_step():
+        with ENDPOINTS_LOCK:
+            methods.endpoints_delete(
+                endpoints_s3_bucket_name,
+                endpoints_s3_key,
+                endpoint_name,
+                dynamic_domain_name,
+                endpoints_update_key,
+            )
+        return {'endpoint_name': endpoint_name}
+
+    def delete_record_step():
+        methods.delete_record(
+            dynamic_zone_id,
+            dynamic_domain_name,
+        )
+        return {'record_name': methods.sanitize_string_dns(dynamic_domain_name)}
+
+    def delete_service_step():
+        service_name = methods.sanitize_string_alphanum_hyphen(resource_name)
+        existing_service = methods.describe_service(cluster_name, service_name)
+        logger.debug(f"Looking for service named {service_name} in cluster {cluster_name}: {existing_service}")
+
+        if not existing_service or existing_service['status'] == 'INACTIVE':
+            logger.info(f"ECS Service {resource_name} not found, skipping deletion")
+            return {}
+
+        logger.info(f"ECS Service {resource_name} exists, will delete")
+        response = methods.delete_service(
+            resource_name,
+            cluster_name,
+        )
+        logger.info(f"Successfully deleted service {resource_name} from cluster {cluster_name}")
+        logger.debug(response)
+
+        return {'service_arn': existing_service['serviceArn']}
+
+    def delete_listener_rule_step():
+        try:
+            dynamic_target_group_arn: str = methods.describe_target_group_name(resource_name)['TargetGroupArn']
+        except methods.elbv2.exceptions.TargetGroupNotFoundException:
+            logger.info(f"Target group {resource_name} not found, "
+                        f"skipping deletion of listener rule and target group")
+            return {}
+
+        response = methods.delete_alb_host_listener_rule(
+            target_alb_arn,
+            dynamic_target_group_arn,
+            dynamic_domain_name
+        )
+        logger.debug(f"delete alb host listener response: {response}")
+
+        return {'target_group_arn': dynamic_target_group_arn}
+
+    def delete_target_group_step():
+        if 'target_group_arn' not in listener_rule:
+            return {}
+
+        response = methods.elbv2.delete_target_group(
+            TargetGroupArn=listener_rule['target_group_arn']
+        )
+        logger.info(f"Deleted target group {listener_rule['target_group_arn']}")
+        logger.debug(f"delete target group response: {response}")
+
+        return {'target_group_arn': listener_rule['target_group_arn']}
+
+    def delete_task_family_step():
+        deleted_tasks = methods.delete_task_family(
+            resource_name,
+        )
+        logger.info(f"Deleted all task definitions for family: {resource_name}, "
+                    f"{deleted_tasks} tasks deleted total")
+        return {'deleted_task_definitions': deleted_tasks}
+
+    # deleted resources are not recreated by eden, so completed steps are not verified
+    journal = journal or NullJournal()
+
+    journal.run('endpoints', endpoints_delete_step)
+    journal.run('record', delete_record_step)
+    journal.run('service', delete_service_step)
+    listener_rule = journal.run('listener_rule', delete_listener_rule_step)
+    journal.run('target_group', delete_target_group_step)
+    journal.run('task_family', delete_task_family_step)
+
+    logger.info(f"Successfully finished deleting environment {resource_name}")
+
+    return {
+        'name': resource_name,
+    }
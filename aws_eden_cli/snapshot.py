@@ -0,0 +1,106 @@
+import datetime
+import json
+import logging
+import os
+import time
+import uuid
+
+from . import consts, provision, utils
+
+logger = logging.getLogger()
+
+# profile parameters that determine the reference resources
+REFERENCE_PARAMETERS = [
+    'reference_service_arn',
+    'target_cluster',
+    'master_alb_arn',
+    'dynamic_zone_id',
+]
+
+
+def local_path(profile_name):
+    return os.path.join(os.path.expanduser(consts.DEFAULT_SNAPSHOT_DIRECTORY), f"{profile_name}.json")
+
+
+def capture(profile: dict, ttl: float, version: int):
+    return {
+        # versions are for humans, IDs tell hosts whether their local copy is the current snapshot
+        'id': uuid.uuid4().hex,
+        'version': version,
+        'created_at': datetime.datetime.now().isoformat(),
+        'expires_at': time.time() + ttl,
+        'parameters': {k: profile[k] for k in REFERENCE_PARAMETERS},
+        'reference': provision.describe_reference(profile),
+    }
+
+
+def dumps(snapshot: dict):
+    # describe responses contain datetimes, which are not needed for cloning
+    return json.dumps(snapshot, default=str)
+
+
+def is_valid(snapshot: dict, profile: dict):
+    if snapshot is None:
+        return False
+
+    if snapshot['expires_at'] < time.time():
+        logger.info(f"Reference snapshot version {snapshot['version']} expired")
+        return False
+
+    if snapshot['parameters'] != {k: profile[k] for k in REFERENCE_PARAMETERS}:
+        logger.info(f"Reference snapshot version {snapshot['version']} was taken with different profile parameters")
+        return False
+
+    return True
+
+
+def load_local(profile_name):
+    try:
+        with open(local_path(profile_name), mode='r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def save_local(profile_name, snapshot: dict):
+    utils.write_file_atomic(local_path(profile_name), dumps(snapshot))
+
+
+def remove_local(profile_name):
+    if os.path.exists(local_path(profile_name)):
+        os.remove(local_path(profile_name))
+
+
+def load(state, profile_name, profile: dict):
+    """
+    Returns reference resources from a valid snapshot, None if there is no valid snapshot.
+    The local copy is used only if it is the snapshot stored with the remote profile,
+    so snapshots invalidated or retaken on other hosts are not used
+    (profiles that were never pushed use the local snapshot only).
+    """
+    remote_id = state.fetch_profile_snapshot_id(profile_name)
+    if remote_id is None:
+        logger.warning(f"Failed to read reference snapshot ID of profile {profile_name}, not using snapshot")
+        return None
+
+    if remote_id == '':
+        logger.info(f"Profile {profile_name} has no reference snapshot")
+        return None
+
+    snapshot = load_local(profile_name)
+
+    if remote_id is not False and (snapshot is None or snapshot.get('id') != remote_id):
+        remote_snapshot = state.fetch_profile_snapshot(profile_name)
+        snapshot = json.loads(remote_snapshot) if remote_snapshot else None
+
+        if not is_valid(snapshot, profile):
+            return None
+
+        save_local(profile_name, snapshot)
+
+    elif not is_valid(snapshot, profile):
+        return None
+
+    logger.info(f"Using reference snapshot version {snapshot['version']} of profile {profile_name} "
+                f"(taken at {snapshot['created_at']})")
+    return snapshot['reference']
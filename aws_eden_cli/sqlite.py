@@ -0,0 +1,324 @@
+import datetime
+import decimal
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+from .state import LocalState, EXPORTED_KINDS, JOB_KIND_QUEUED, JOB_KIND_RUNNING
+
+logger = logging.getLogger()
+
+
+class SQLiteState(LocalState):
+    """
+    Local state backend, rows mirror DynamoDB items:
+    key attributes and indexed attributes are stored in columns,
+    the whole item is stored as DynamoDB JSON in the item column.
+    """
+
+    def __init__(self, table_name: str, path: str):
+        self.table_name = table_name
+        self.path = os.path.expanduser(path)
+
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        # connection is shared between threads (stats etc.), access is serialized with lock
+        self.connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self.lock = threading.RLock()
+
+        self.serializer = TypeSerializer()
+        self.deserializer = TypeDeserializer()
+
+    def _execute(self, sql: str, parameters=()):
+        with self.lock:
+            return self.connection.execute(sql.format(table=self.table_name), parameters).fetchall()
+
+    def _executemany(self, sql: str, parameters):
+        with self.lock:
+            self.connection.execute('BEGIN')
+            try:
+                self.connection.executemany(sql.format(table=self.table_name), parameters)
+            except Exception:
+                self.connection.execute('ROLLBACK')
+                raise
+            self.connection.execute('COMMIT')
+
+    def _encode(self, item: dict):
+        return (
+            item['type'],
+            item['name'],
+            item.get('kind'),
+            float(item['last_updated']) if 'last_updated' in item else None,
+            json.dumps({k: self.serializer.serialize(v) for k, v in item.items()}),
+        )
+
+    def _decode(self, row: str):
+        return {k: self.deserializer.deserialize(v) for k, v in json.loads(row).items()}
+
+    def _put(self, item: dict):
+        self._executemany('INSERT OR REPLACE INTO "{table}" (type, name, kind, last_updated, item) '
+                          'VALUES (?, ?, ?, ?, ?)', [self._encode(item)])
+
+    def _handle_error(self, e: Exception):
+        if isinstance(e, sqlite3.OperationalError) and 'no such table' in str(e):
+            logger.error("eden table not found, please create table with "
+                         "\"eden config push\" or \"eden create\" first")
+        else:
+            logger.error(f"SQLite error: {e}")
+
+    def _get_item(self, key: dict, missing=None):
+        try:
+            rows = self._execute('SELECT item FROM "{table}" WHERE type = ? AND name = ?', (key['type'], key['name']))
+        except sqlite3.Error as e:
+            self._handle_error(e)
+            return None
+
+        if len(rows) == 0:
+            return missing
+        return self._decode(rows[0][0])
+
+    def _update_item(self, key: dict, update):
+        with self.lock:
+            try:
+                # IMMEDIATE takes the write lock before reading,
+                # so read-modify-write is atomic for other processes as well
+                self.connection.execute('BEGIN IMMEDIATE')
+                try:
+                    rows = self.connection.execute(
+                        'SELECT item FROM "{table}" WHERE type = ? AND name = ?'.format(table=self.table_name),
+                        (key['type'], key['name']),
+                    ).fetchall()
+
+                    item = update(self._decode(rows[0][0]) if len(rows) > 0 else None)
+                    if item is not None:
+                        self.connection.execute(
+                            'INSERT OR REPLACE INTO "{table}" (type, name, kind, last_updated, item) '
+                            'VALUES (?, ?, ?, ?, ?)'.format(table=self.table_name),
+                            self._encode(item),
+                        )
+                except Exception:
+                    self.connection.execute('ROLLBACK')
+                    raise
+                self.connection.execute('COMMIT')
+
+            except sqlite3.Error as e:
+                self._handle_error(e)
+                return None
+
+        return item is not None
+
+    def get_table_name(self):
+        return self.table_name
+
+    def create_remote_state_table(self):
+        self._execute('CREATE TABLE IF NOT EXISTS "{table}" ('
+                      'type TEXT NOT NULL, '
+                      'name TEXT NOT NULL, '
+                      'kind TEXT, '
+                      'last_updated REAL, '
+                      'item TEXT NOT NULL, '
+                      'PRIMARY KEY (type, name))')
+        # equivalent of kind_last_updated_gsi
+        self._execute('CREATE INDEX IF NOT EXISTS "{table}_kind_last_updated" ON "{table}" (kind, last_updated)')
+
+    def check_remote_state_table(self, auto_create: bool = False):
+        try:
+            rows = self._execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                 (self.table_name,))
+            if len(rows) == 0:
+                if auto_create:
+                    logger.info(f"Local state table {self.table_name} does not exist in {self.path}, creating...")
+                    self.create_remote_state_table()
+                else:
+                    logger.error(f"Local state table {self.table_name} does not exist in {self.path}")
+                    return False
+        except sqlite3.Error as e:
+            logger.error(f"SQLite error: {e}")
+            return False
+
+        return True
+
+    def delete_profile(self, profile_name):
+        try:
+            self._execute('DELETE FROM "{table}" WHERE type = ? AND name = ?', ('_profile', profile_name))
+        except sqlite3.Error as e:
+            self._handle_error(e)
+            return False
+        return True
+
+    def put_profile(self, profile_name, profile_dict):
+        try:
+            self._put({
+                'type': '_profile',
+                'name': profile_name,
+                'profile': json.dumps(profile_dict),
+                'kind': 'profile',
+            })
+        except sqlite3.Error as e:
+            self._handle_error(e)
+            return False
+        return True
+
+    def fetch_all_environments(self, consistent: bool = False):
+        environments = {}
+
+        try:
+            rows = self._execute('SELECT item FROM "{table}" WHERE kind = ?', ('environment',))
+        except sqlite3.Error as e:
+            self._handle_error(e)
+            return None
+
+        for row, in rows:
+            item = self._decode(row)
+            env_type: str = item.pop('type')
+
+            if env_type not in environments:
+                environments[env_type] = []
+
+            environments[env_type].append(item)
+
+        return environments
+
+    def fetch_all_profiles(self):
+        profiles = {}
+
+        try:
+            rows = self._execute('SELECT item FROM "{table}" WHERE type = ?', ('_profile',))
+        except sqlite3.Error as e:
+            self._handle_error(e)
+            return None
+
+        for row, in rows:
+            item = self._decode(row)
+            profiles[item['name']] = item['profile']
+
+        return profiles
+
+    def fetch_profile(self, profile_name):
+        try:
+            rows = self._execute('SELECT item FROM "{table}" WHERE type = ? AND name = ?', ('_profile', profile_name))
+        except sqlite3.Error as e:
+            self._handle_error(e)
+            return None
+
+        if len(rows) == 0:
+            logger.warning(f"Profile {profile_name} not found in remote table!")
+            return None
+
+        item = self._decode(rows[0][0])
+        if 'profile' not in item:
+            logger.warning(f"Profile {profile_name} does not contain any parameters!")
+            return None
+
+        try:
+            profile_json = json.loads(item['profile'])
+        except json.JSONDecodeError as e:
+            logger.error(f"JSON decode error: {e}")
+            return None
+
+        return profile_json
+
+    def put_environment(self, profile_name, name, cname, image_uri=None):
+        item = {
+            'type': profile_name,
+            'name': name,
+            'last_updated': decimal.Decimal(datetime.datetime.now().timestamp()),
+            'endpoint': cname,
+            'kind': 'environment',
+        }
+        if image_uri is not None:
+            item['image_uri'] = image_uri
+
+        try:
+            self._put(item)
+        except sqlite3.Error as e:
+            self._handle_error(e)
+            return None
+        return item
+
+    def delete_environment(self, profile_name, name):
+        try:
+            self._execute('DELETE FROM "{table}" WHERE type = ? AND name = ?', (profile_name, name))
+        except sqlite3.Error as e:
+            self._handle_error(e)
+            return None
+        return {}
+
+    def count_environments_by_profile(self):
+        try:
+            rows = self._execute('SELECT type, COUNT(*) FROM "{table}" WHERE kind = ? GROUP BY type',
+                                 ('environment',))
+        except sqlite3.Error as e:
+            self._handle_error(e)
+            return None
+
+        return {profile_name: count for profile_name, count in rows}
+
+    def count_environments_updated_between(self, start: float, end: float):
+        try:
+            rows = self._execute('SELECT COUNT(*) FROM "{table}" WHERE kind = ? AND last_updated > ? AND last_updated <= ?',
+                                 ('environment', start, end))
+        except sqlite3.Error as e:
+            self._handle_error(e)
+            return None
+
+        return rows[0][0]
+
+    def fetch_oldest_environments(self, limit: int, profile_counts: dict):
+        oldest = {}
+
+        try:
+            rows = self._execute('SELECT type, name, last_updated FROM ('
+                                 'SELECT type, name, last_updated, '
+                                 'ROW_NUMBER() OVER (PARTITION BY type ORDER BY last_updated) AS position '
+                                 'FROM "{table}" WHERE kind = ?) '
+                                 'WHERE position <= ? ORDER BY last_updated',
+                                 ('environment', limit))
+        except sqlite3.Error as e:
+            self._handle_error(e)
+            return None
+
+        for profile_name, name, last_updated in rows:
+            oldest.setdefault(profile_name, []).append({
+                'name': name,
+                'last_updated': last_updated,
+            })
+
+        return oldest
+
+    def export_items(self, segments: int = 4):
+        placeholders = ', '.join('?' * len(EXPORTED_KINDS))
+        rows = self._execute('SELECT item FROM "{table}" WHERE kind IN (' + placeholders + ')', EXPORTED_KINDS)
+        for row, in rows:
+            yield json.loads(row)
+
+    def batch_write_items(self, items: list, max_retries: int = 8):
+        try:
+            self._executemany('INSERT OR REPLACE INTO "{table}" (type, name, kind, last_updated, item) '
+                              'VALUES (?, ?, ?, ?, ?)',
+                              [self._encode({k: self.deserializer.deserialize(v) for k, v in item.items()})
+                               for item in items])
+        except sqlite3.Error as e:
+            self._handle_error(e)
+            return False
+        return True
+
+    def fetch_queued_jobs(self, limit: int):
+        try:
+            # queued jobs first, then running jobs whose claim expired
+            rows = self._execute('SELECT item FROM "{table}" '
+                                 'WHERE kind = ? OR (kind = ? AND last_updated < ?) '
+                                 'ORDER BY kind = ?, last_updated LIMIT ?',
+                                 (JOB_KIND_QUEUED, JOB_KIND_RUNNING, time.time(), JOB_KIND_RUNNING, limit))
+        except sqlite3.Error as e:
+            self._handle_error(e)
+            return None
+
+        return [self._decode(row) for row, in rows]
@@ -0,0 +1,399 @@
+import abc
+import decimal
+import json
+import time
+
+LEASE_RUNNING = 'running'
+LEASE_SUCCEEDED = 'succeeded'
+LEASE_FAILED = 'failed'
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_SUCCEEDED = 'succeeded'
+JOB_FAILED = 'failed'
+
+# queued jobs have their own kind, so kind_last_updated_gsi returns only queued jobs in enqueue order
+JOB_KIND_QUEUED = 'job_queued'
+# running jobs store claimed_until as last_updated, so jobs of crashed workers are found with one range query
+JOB_KIND_RUNNING = 'job_running'
+# finished jobs have no last_updated, so they leave kind_last_updated_gsi
+JOB_KIND = 'job'
+
+# rows copied by state export/import, leases, jobs, journals and layout rows belong to their table
+EXPORTED_KINDS = ('environment', 'profile')
+
+JOURNAL_RUNNING = 'running'
+JOURNAL_SUCCEEDED = 'succeeded'
+JOURNAL_FAILED = 'failed'
+JOURNAL_KIND = 'journal'
+
+
+def lease_key(profile_name, name):
+    return {
+        'type': f"_lease#{profile_name}",
+        'name': name,
+    }
+
+
+def profile_key(profile_name):
+    # local backends are never sharded
+    return {
+        'type': '_profile',
+        'name': profile_name,
+    }
+
+
+def job_key(job_id):
+    return {
+        'type': '_job',
+        'name': job_id,
+    }
+
+
+def journal_key(profile_name, name):
+    return {
+        'type': f"_journal#{profile_name}",
+        'name': name,
+    }
+
+
+class State(abc.ABC):
+    """
+    eden state backend interface.
+
+    Methods log errors and return None/False instead of raising,
+    environments and profiles are returned in the same shape by every backend.
+    """
+
+    @abc.abstractmethod
+    def get_table_name(self):
+        pass
+
+    @abc.abstractmethod
+    def check_remote_state_table(self, auto_create: bool = False):
+        pass
+
+    @abc.abstractmethod
+    def delete_profile(self, profile_name):
+        pass
+
+    @abc.abstractmethod
+    def put_profile(self, profile_name, profile_dict):
+        pass
+
+    @abc.abstractmethod
+    def fetch_all_environments(self, consistent: bool = False):
+        """With consistent, remote backends use strongly consistent reads (local backends always do)"""
+        pass
+
+    @abc.abstractmethod
+    def fetch_all_profiles(self):
+        pass
+
+    @abc.abstractmethod
+    def fetch_profile(self, profile_name):
+        pass
+
+    @abc.abstractmethod
+    def put_environment(self, profile_name, name, cname, image_uri=None):
+        pass
+
+    @abc.abstractmethod
+    def delete_environment(self, profile_name, name):
+        pass
+
+    @abc.abstractmethod
+    def count_environments_by_profile(self):
+        pass
+
+    @abc.abstractmethod
+    def count_environments_updated_between(self, start: float, end: float):
+        """Count environments with start < last_updated <= end, so adjacent ranges do not overlap"""
+        pass
+
+    @abc.abstractmethod
+    def fetch_oldest_environments(self, limit: int, profile_counts: dict):
+        """profile_counts (see count_environments_by_profile) lets remote backends stop reading early"""
+        pass
+
+    @abc.abstractmethod
+    def export_items(self, segments: int = 4):
+        """Iterate over all items as DynamoDB JSON (typed) dicts"""
+        pass
+
+    @abc.abstractmethod
+    def batch_write_items(self, items: list, max_retries: int = 8):
+        """Write DynamoDB JSON (typed) items, as produced by export_items"""
+        pass
+
+    @abc.abstractmethod
+    def acquire_lease(self, profile_name, name, holder, image_uri, ttl):
+        """Returns True if acquired, False if held by another running holder, None on error"""
+        pass
+
+    @abc.abstractmethod
+    def fetch_lease(self, profile_name, name):
+        pass
+
+    @abc.abstractmethod
+    def renew_lease(self, profile_name, name, holder, ttl):
+        """Returns False if the lease is not held by holder anymore"""
+        pass
+
+    @abc.abstractmethod
+    def request_lease_image(self, profile_name, name, image_uri):
+        """Ask the running holder to deploy image_uri next, returns False if the lease is not running"""
+        pass
+
+    @abc.abstractmethod
+    def release_lease(self, profile_name, name, holder, status, deployed_image_uri, result):
+        """
+        Returns False if the lease was lost or,
+        for succeeded leases, a different image was requested since deployed_image_uri
+        """
+        pass
+
+    @abc.abstractmethod
+    def put_job(self, job: dict):
+        """Store new job, job dict must contain job_key attributes"""
+        pass
+
+    @abc.abstractmethod
+    def fetch_job(self, job_id):
+        pass
+
+    @abc.abstractmethod
+    def fetch_queued_jobs(self, limit: int):
+        """Oldest queued jobs first, followed by running jobs whose claim expired"""
+        pass
+
+    @abc.abstractmethod
+    def claim_job(self, job_id, worker, ttl):
+        """
+        Mark queued (or expired running) job as running for ttl seconds,
+        returns False if job was claimed by another worker
+        """
+        pass
+
+    @abc.abstractmethod
+    def renew_job(self, job_id, worker, ttl):
+        """Extend claim of running job, returns False if the claim was lost"""
+        pass
+
+    @abc.abstractmethod
+    def finish_job(self, job_id, worker, attributes: dict):
+        """
+        Set attributes of job claimed by worker and remove its last_updated,
+        returns False if the claim was lost
+        """
+        pass
+
+    @abc.abstractmethod
+    def update_job(self, job_id, attributes: dict):
+        pass
+
+    @abc.abstractmethod
+    def put_journal(self, profile_name, name, journal: dict):
+        """Store journal attributes, replacing the previous journal of the environment"""
+        pass
+
+    @abc.abstractmethod
+    def fetch_journal(self, profile_name, name):
+        pass
+
+    @abc.abstractmethod
+    def update_journal(self, profile_name, name, attributes: dict):
+        pass
+
+    @abc.abstractmethod
+    def put_profile_snapshot(self, profile_name, snapshot: str, snapshot_id: str):
+        """Store reference snapshot with the profile, returns False if profile does not exist"""
+        pass
+
+    @abc.abstractmethod
+    def fetch_profile_snapshot(self, profile_name):
+        pass
+
+    @abc.abstractmethod
+    def fetch_profile_snapshot_id(self, profile_name):
+        """
+        Returns ID of the stored snapshot without reading the snapshot itself,
+        '' if the profile has no snapshot, False if the profile does not exist, None on error
+        """
+        pass
+
+    @abc.abstractmethod
+    def delete_profile_snapshot(self, profile_name):
+        pass
+
+
+class LocalState(State, abc.ABC):
+    """
+    Base for backends that can atomically read-modify-write single items
+    (local backends without conditional writes).
+    """
+
+    @abc.abstractmethod
+    def _get_item(self, key: dict, missing=None):
+        """Returns missing if the item does not exist, None on error"""
+        pass
+
+    @abc.abstractmethod
+    def _update_item(self, key: dict, update):
+        """
+        Atomically replace item with update(item),
+        update receives None for missing items and returns None to leave item unchanged.
+        Returns True if item was replaced, False if not, None on error
+        """
+        pass
+
+    def acquire_lease(self, profile_name, name, holder, image_uri, ttl):
+        now = time.time()
+
+        def update(item):
+            if item is not None and item['status'] == LEASE_RUNNING and item['expires_at'] >= now:
+                return None
+
+            return {
+                **lease_key(profile_name, name),
+                'kind': 'lease',
+                'holder': holder,
+                'status': LEASE_RUNNING,
+                'image_uri': image_uri,
+                'expires_at': decimal.Decimal(str(now + ttl)),
+            }
+
+        return self._update_item(lease_key(profile_name, name), update)
+
+    def fetch_lease(self, profile_name, name):
+        return self._get_item(lease_key(profile_name, name))
+
+    def renew_lease(self, profile_name, name, holder, ttl):
+        def update(item):
+            if item is None or item['holder'] != holder or item['status'] != LEASE_RUNNING:
+                return None
+            return dict(item, expires_at=decimal.Decimal(str(time.time() + ttl)))
+
+        return bool(self._update_item(lease_key(profile_name, name), update))
+
+    def request_lease_image(self, profile_name, name, image_uri):
+        now = time.time()
+
+        def update(item):
+            if item is None or item['status'] != LEASE_RUNNING or item['expires_at'] < now:
+                return None
+            return dict(item, image_uri=image_uri)
+
+        return bool(self._update_item(lease_key(profile_name, name), update))
+
+    def release_lease(self, profile_name, name, holder, status, deployed_image_uri, result):
+        def update(item):
+            if item is None or item['holder'] != holder:
+                return None
+            if status == LEASE_SUCCEEDED and item['image_uri'] != deployed_image_uri:
+                return None
+            return dict(item, status=status, deployed_image_uri=deployed_image_uri, result=json.dumps(result))
+
+        return bool(self._update_item(lease_key(profile_name, name), update))
+
+    def put_job(self, job: dict):
+        def update(item):
+            if item is not None:
+                return None
+            return dict(job)
+
+        return bool(self._update_item(job_key(job['name']), update))
+
+    def fetch_job(self, job_id):
+        return self._get_item(job_key(job_id))
+
+    def claim_job(self, job_id, worker, ttl):
+        now = time.time()
+
+        def update(item):
+            if item is None:
+                return None
+            if item['status'] != JOB_QUEUED and not (item['status'] == JOB_RUNNING and item['claimed_until'] < now):
+                return None
+
+            claimed_until = decimal.Decimal(str(now + ttl))
+            return dict(item, status=JOB_RUNNING, kind=JOB_KIND_RUNNING, worker=worker,
+                        claimed_until=claimed_until, last_updated=claimed_until)
+
+        return bool(self._update_item(job_key(job_id), update))
+
+    def renew_job(self, job_id, worker, ttl):
+        def update(item):
+            if item is None or item['status'] != JOB_RUNNING or item['worker'] != worker:
+                return None
+
+            claimed_until = decimal.Decimal(str(time.time() + ttl))
+            return dict(item, claimed_until=claimed_until, last_updated=claimed_until)
+
+        return bool(self._update_item(job_key(job_id), update))
+
+    def finish_job(self, job_id, worker, attributes: dict):
+        def update(item):
+            if item is None or item['status'] != JOB_RUNNING or item['worker'] != worker:
+                return None
+
+            finished = dict(item, **attributes)
+            del finished['last_updated']
+            return finished
+
+        return bool(self._update_item(job_key(job_id), update))
+
+    def update_job(self, job_id, attributes: dict):
+        def update(item):
+            if item is None:
+                return None
+            return dict(item, **attributes)
+
+        return bool(self._update_item(job_key(job_id), update))
+
+    def put_journal(self, profile_name, name, journal: dict):
+        item = {
+            **journal_key(profile_name, name),
+            'kind': JOURNAL_KIND,
+            **journal,
+        }
+        return bool(self._update_item(journal_key(profile_name, name), lambda _: item))
+
+    def fetch_journal(self, profile_name, name):
+        return self._get_item(journal_key(profile_name, name))
+
+    def update_journal(self, profile_name, name, attributes: dict):
+        def update(item):
+            if item is None:
+                return None
+            return dict(item, **attributes)
+
+        return bool(self._update_item(journal_key(profile_name, name), update))
+
+    def put_profile_snapshot(self, profile_name, snapshot: str, snapshot_id: str):
+        def update(item):
+            if item is None:
+                return None
+            return dict(item, snapshot=snapshot, snapshot_id=snapshot_id)
+
+        return self._update_item(profile_key(profile_name), update)
+
+    def fetch_profile_snapshot(self, profile_name):
+        item = self._get_item(profile_key(profile_name))
+        if item is None:
+            return None
+        return item.get('snapshot')
+
+    def fetch_profile_snapshot_id(self, profile_name):
+        item = self._get_item(profile_key(profile_name), missing=False)
+        if not item:
+            return item
+        return item.get('snapshot_id', '')
+
+    def delete_profile_snapshot(self, profile_name):
+        def update(item):
+            if item is None or 'snapshot' not in item:
+                return None
+            return {k: v for k, v in item.items() if k not in ('snapshot', 'snapshot_id')}
+
+        return self._update_item(profile_key(profile_name), update) is not None
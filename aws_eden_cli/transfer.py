@@ -0,0 +1,109 @@
+import concurrent.futures
+import gzip
+import itertools
+import json
+import logging
+import os
+
+from . import utils
+from .state import EXPORTED_KINDS
+
+logger = logging.getLogger()
+
+# BatchWriteItem accepts at most 25 put requests
+BATCH_SIZE = 25
+# batches per worker submitted between two checkpoints
+BATCHES_PER_WORKER = 4
+
+
+def checkpoint_path(path):
+    return f"{path}.checkpoint"
+
+
+def read_checkpoint(path):
+    try:
+        with open(checkpoint_path(path), mode='r') as f:
+            return int(f.read().strip())
+    except FileNotFoundError:
+        return 0
+
+
+def write_checkpoint(path, lines):
+    utils.write_file_atomic(checkpoint_path(path), str(lines))
+
+
+def export_state(state, path, segments):
+    exported = 0
+
+    try:
+        with gzip.open(path, mode='wt') as f:
+            for item in state.export_items(segments):
+                f.write(json.dumps(item, sort_keys=True))
+                f.write('\n')
+                exported += 1
+
+                if exported % 1000 == 0:
+                    logger.info(f"Exported {exported} items")
+
+    except Exception as e:
+        # gzip.open fails before creating the file for unwritable paths
+        if os.path.exists(path):
+            os.remove(path)
+
+        if hasattr(e, 'response') and 'Error' in e.response:
+            logger.error(e.response['Error']['Message'])
+            return None
+        else:
+            logger.error(f"Unknown exception raised: {e}")
+            return None
+
+    return exported
+
+
+def import_state(state, path, workers, resume=False):
+    skip = read_checkpoint(path) if resume else 0
+    if skip > 0:
+        logger.info(f"Resuming import from checkpoint, skipping {skip} items")
+
+    imported = skip
+    skipped = 0
+    window_size = workers * BATCH_SIZE * BATCHES_PER_WORKER
+
+    try:
+        with gzip.open(path, mode='rt') as f, \
+                concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            lines = itertools.islice(f, skip, None)
+
+            while True:
+                window = [json.loads(line) for line in itertools.islice(lines, window_size)]
+                if len(window) == 0:
+                    break
+
+                # files exported by older versions contain leases, jobs, journals and layout rows
+                items = [item for item in window if item.get('kind', {}).get('S') in EXPORTED_KINDS]
+                skipped += len(window) - len(items)
+
+                batches = [items[i:i + BATCH_SIZE] for i in range(0, len(items), BATCH_SIZE)]
+                results = list(executor.map(state.batch_write_items, batches))
+
+                if not all(results):
+                    logger.error(f"Import failed after {imported} items, "
+                                 f"rerun with --resume to continue from checkpoint")
+                    return None
+
+                imported += len(window)
+                write_checkpoint(path, imported)
+                logger.info(f"Imported {imported} items")
+
+    except (OSError, EOFError, ValueError) as e:
+        # missing, corrupt or truncated file (BadGzipFile is an OSError, JSONDecodeError a ValueError)
+        logger.error(f"Failed to read {path} after {imported} items: {e}")
+        return None
+
+    if os.path.exists(checkpoint_path(path)):
+        os.remove(checkpoint_path(path))
+
+    if skipped > 0:
+        logger.info(f"Skipped {skipped} items that are not environments or profiles")
+
+    return imported - skipped
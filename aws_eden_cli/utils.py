@@ -1,9 +1,10 @@
 import configparser
 import logging
 import os
+import tempfile
 from pathlib import Path
 
-from . import consts
+from . import consts, dynamodb, memory, sqlite
 
 logger = logging.getLogger()
 
@@ -38,7 +39,7 @@ def config_write_overrides(args, config, profile_name, fail_on_missing_non_defau
             logger.error("")
             return None, None
 
-    for parameter in consts.parameters:
+    for parameter in consts.parameters + consts.optional_parameters:
         key = parameter['name']
 
         if key not in args:
@@ -85,6 +86,14 @@ def check_profile(config, profile):
             errors += 1
             continue
 
+    for parameter in consts.optional_parameters:
+        key = parameter['name']
+
+        if key in config[profile] and not parameter['validator'](config[profile][key]):
+            logger.error(f"Validation failed for key {key} in profile {profile}")
+            errors += 1
+            continue
+
     for k in config[profile]:
         if k not in consts.parameter_names:
             logger.error(f"Unknown config key {k} in profile {profile}")
@@ -133,3 +142,46 @@ def dump_profile(args, config, profile_name):
             variables[parameter_name] = config[profile_name][parameter_name]
 
     return variables
+
+
+def write_file_atomic(path, content: str):
+    # write to temporary file first, so readers never see a partial file
+    # and an interrupted write keeps the previous file
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+
+    fd, temporary_path = tempfile.mkstemp(dir=directory or os.curdir, prefix=f"{os.path.basename(path)}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode='w') as f:
+            f.write(content)
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.remove(temporary_path)
+        raise
+
+
+def create_state(args, config, profile_name, session=None):
+    # flags take precedence over profile configuration
+    backend = args.get('state_backend')
+    path = args.get('state_path')
+
+    if config is not None and profile_name in config:
+        backend = backend or config[profile_name].get('state_backend')
+        path = path or config[profile_name].get('state_path')
+
+    backend = backend or consts.DEFAULT_STATE_BACKEND
+    path = path or consts.DEFAULT_STATE_PATH
+    table_name = args.get('remote_table_name', consts.DEFAULT_TABLE_NAME)
+
+    logger.debug(f"Using {backend} state backend, table {table_name}")
+
+    if backend == 'dynamodb':
+        return dynamodb.DynamoDBState(table_name, session=session, endpoint_url=args.get('endpoint_url'))
+    elif backend == 'sqlite':
+        return sqlite.SQLiteState(table_name, path)
+    elif backend == 'memory':
+        return memory.MemoryState(table_name)
+
+    logger.error(f"Unknown state backend {backend}")
+    return None
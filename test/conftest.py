@@ -0,0 +1,51 @@
+import os
+import uuid
+
+import pytest
+from moto import mock_aws
+
+# aws_eden_core creates boto3 clients on import, moto needs credentials
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+
+from aws_eden_cli import dynamodb, memory, sqlite  # noqa: E402
+
+
+@pytest.fixture
+def memory_state():
+    # in-memory tables are shared by name within the process
+    state = memory.MemoryState(f"eden-{uuid.uuid4().hex[:8]}")
+    state.check_remote_state_table(auto_create=True)
+    return state
+
+
+@pytest.fixture
+def sqlite_state(tmp_path):
+    state = sqlite.SQLiteState('eden', str(tmp_path / 'state.db'))
+    state.check_remote_state_table(auto_create=True)
+    yield state
+    state.connection.close()
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def local_state(request):
+    return request.getfixturevalue(f"{request.param}_state")
+
+
+@pytest.fixture
+def dynamodb_state(monkeypatch):
+    # short layout timings, so migration tests do not wait for minutes
+    monkeypatch.setattr(dynamodb, 'LAYOUT_CACHE_TTL', 0.2)
+    monkeypatch.setattr(dynamodb, 'LAYOUT_MIGRATION_GRACE', 0.5)
+    monkeypatch.setattr(dynamodb, 'LAYOUT_POLL_INTERVAL', 0.1)
+
+    with mock_aws():
+        state = dynamodb.DynamoDBState('eden')
+        assert state.check_remote_state_table(auto_create=True)
+        yield state
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'dynamodb'])
+def any_state(request):
+    return request.getfixturevalue(f"{request.param}_state")
@@ -0,0 +1,69 @@
+from aws_eden_cli import bench, sqlite
+
+
+def test_parse_mix():
+    assert bench.parse_mix('put=3, delete=1') == {'put': 3, 'delete': 1}
+    assert bench.parse_mix('put=3,scan=1') is None
+    assert bench.parse_mix('put=x') is None
+    assert bench.parse_mix('put=0') is None
+
+
+def test_percentile():
+    values = list(range(1, 101))
+
+    assert bench.percentile(values, 50) == 50
+    assert bench.percentile(values, 99) == 99
+    assert bench.percentile(values, 100) == 100
+    assert bench.percentile([7], 95) == 7
+    assert bench.percentile([], 50) is None
+
+
+def test_default_table_is_refused(tmp_path, memory_state):
+    default_state = sqlite.SQLiteState('eden', str(tmp_path / 'state.db'))
+    dedicated_state = sqlite.SQLiteState('eden-bench', str(tmp_path / 'state.db'))
+
+    assert not bench.check_target(default_state)
+    assert bench.check_target(default_state, endpoint_url='http://localhost:8000')
+    assert bench.check_target(dedicated_state)
+    assert bench.check_target(memory_state)
+
+    default_state.connection.close()
+    dedicated_state.connection.close()
+
+
+def test_report_of_consistent_run(memory_state):
+    report = bench.run(lambda: memory_state, 4, 25, bench.parse_mix(bench.DEFAULT_MIX), 2, seed=1)
+
+    assert report['total'] == 100
+    assert report['throttles'] == 0
+    assert report['lost_rows'] == report['unexpected_rows'] == report['duplicated_rows'] == []
+    assert sum(result['errors'] for result in report['operations'].values()) == 0
+
+    # benchmark rows are removed afterwards
+    assert memory_state.fetch_all_environments() == {}
+
+
+class LosingState:
+    """Acknowledges every other put without writing it"""
+
+    def __init__(self, state):
+        self.state = state
+        self.puts = 0
+
+    def __getattr__(self, name):
+        return getattr(self.state, name)
+
+    def put_environment(self, *args):
+        self.puts += 1
+        if self.puts % 2 == 0:
+            return True
+        return self.state.put_environment(*args)
+
+
+def test_report_of_lost_rows(memory_state):
+    states = iter([memory_state, LosingState(memory_state)])
+    report = bench.run(lambda: next(states), 1, 10, {'put': 1}, 1, seed=1)
+
+    assert report['expected_rows'] == 10
+    assert len(report['lost_rows']) == 5
+    assert report['unexpected_rows'] == report['duplicated_rows'] == []
@@ -0,0 +1,81 @@
+import boto3
+import pytest
+from moto import mock_aws
+
+from aws_eden_cli import client, dynamodb, fanout
+
+
+@pytest.fixture
+def memory_client(tmp_path):
+    with client.EdenClient(config_path=str(tmp_path / 'config'), state_backend='memory',
+                           table_name='eden-client', no_image_cache=True) as eden:
+        yield eden
+
+
+def test_ls_filters_and_sorts_environments(memory_client):
+    memory_client.state.check_remote_state_table(auto_create=True)
+    for profile_name, name in (('web', 'foo'), ('api', 'bar'), ('api', 'baz')):
+        assert memory_client.state.put_environment(profile_name, name, f"{name}.example.com") is not None
+
+    assert [(e.profile_name, e.name) for e in memory_client.ls()] == [('api', 'bar'), ('api', 'baz'), ('web', 'foo')]
+    assert [e.cname for e in memory_client.ls(['web'])] == ['foo.example.com']
+
+
+def test_duplicate_names_are_rejected(memory_client):
+    assert memory_client.create_many([('foo', 'image:1'), ('foo', 'image:2')]) is None
+    assert memory_client.delete_many(['foo', 'bar', 'foo']) is None
+
+
+def test_unresolvable_images_are_not_created(memory_client, monkeypatch):
+    created = []
+    monkeypatch.setattr(client.environments, 'create_environment', lambda *args, **kwargs: created.append(args))
+
+    assert memory_client.create_many([('foo', 'nginx:latest')]) == {'foo': None}
+    assert created == []
+
+
+def test_state_and_resolver_share_one_session(tmp_path, monkeypatch):
+    sessions = []
+
+    class CountingSession(boto3.session.Session):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            sessions.append(self)
+
+    monkeypatch.setattr(boto3.session, 'Session', CountingSession)
+
+    with mock_aws():
+        with client.EdenClient(config_path=str(tmp_path / 'config')) as eden:
+            assert isinstance(eden.state, dynamodb.DynamoDBState)
+            assert eden.resolver.session is eden.session
+
+    assert sessions == [eden.session]
+
+
+def test_ls_targets_reuses_target_states(tmp_path, monkeypatch):
+    created = []
+
+    def create_target_state(target):
+        created.append(target['source'])
+        return fanout_create_target_state(target)
+
+    fanout_create_target_state = fanout.create_target_state
+    monkeypatch.setattr(fanout, 'create_target_state', create_target_state)
+
+    with mock_aws():
+        for table_name in ('eden', 'eden-other'):
+            state = dynamodb.DynamoDBState(table_name)
+            assert state.check_remote_state_table(auto_create=True)
+            assert state.put_environment('api', 'foo', f"foo.{table_name}.example.com") is not None
+
+        with client.EdenClient(config_path=str(tmp_path / 'config'), state_backend='memory') as eden:
+            for _ in range(2):
+                environment_list, failed = eden.ls_targets('us-east-1,us-east-1::eden-other')
+
+                assert failed == []
+                assert [(e.cname, e.source) for e in environment_list] == [
+                    ('foo.eden.example.com', 'us-east-1'),
+                    ('foo.eden-other.example.com', 'us-east-1::eden-other'),
+                ]
+
+    assert sorted(created) == ['us-east-1', 'us-east-1::eden-other']
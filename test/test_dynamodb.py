@@ -0,0 +1,148 @@
+import threading
+import time
+
+import pytest
+
+from aws_eden_cli import dynamodb, transfer
+
+
+def listed(state):
+    return {
+        (profile_name, environment['name'])
+        for profile_name, environments in state.fetch_all_environments(consistent=True).items()
+        for environment in environments
+    }
+
+
+def test_migrate_round_trip(dynamodb_state):
+    expected = set()
+    for profile_name in ('api', 'web'):
+        assert dynamodb_state.put_profile(profile_name, {'name_prefix': profile_name})
+        for i in range(20):
+            assert dynamodb_state.put_environment(profile_name, f"env-{i}", f"env-{i}.example.com") is not None
+            expected.add((profile_name, f"env-{i}"))
+
+    assert dynamodb_state.migrate_layout(4, segments=2, workers=2)
+    assert dynamodb_state.get_layout() == {'shards': 4, 'version': 2, 'migrating': False}
+    assert listed(dynamodb_state) == expected
+    assert set(dynamodb_state.fetch_all_profiles()) == {'api', 'web'}
+
+    assert dynamodb_state.migrate_layout(1, segments=2, workers=2)
+    assert dynamodb_state.get_shards() == 1
+    assert listed(dynamodb_state) == expected
+    assert dynamodb_state.fetch_profile('web') == {'name_prefix': 'web'}
+
+    # only rows of the current layout are left
+    assert dynamodb_state.count_environments_by_profile() == {'api': 20, 'web': 20}
+
+
+def test_stale_state_writes_with_current_layout(dynamodb_state):
+    stale = dynamodb.DynamoDBState('eden')
+    assert stale.get_shards() == 1
+
+    assert dynamodb_state.migrate_layout(4)
+    time.sleep(dynamodb.LAYOUT_CACHE_TTL)
+
+    assert stale.put_environment('api', 'foo', 'foo.example.com') is not None
+    assert ('api', 'foo') in listed(dynamodb_state)
+
+    # rows written after the migration are not removed by the next one
+    assert dynamodb_state.migrate_layout(4)
+    assert ('api', 'foo') in listed(dynamodb_state)
+
+
+def test_writes_wait_for_running_migration(dynamodb_state):
+    for i in range(10):
+        dynamodb_state.put_environment('api', f"env-{i}", f"env-{i}.example.com")
+
+    writer_state = dynamodb.DynamoDBState('eden')
+
+    def write_during_migration():
+        time.sleep(0.2)
+        writer_state.put_environment('api', 'during', 'during.example.com')
+
+    writer = threading.Thread(target=write_during_migration)
+    writer.start()
+    assert dynamodb_state.migrate_layout(4)
+    writer.join(10)
+
+    assert ('api', 'during') in listed(dynamodb_state)
+    assert len(listed(dynamodb_state)) == 11
+
+
+def test_interrupted_migration_blocks_other_targets(dynamodb_state):
+    layout = dynamodb_state.get_layout(refresh=True)
+    assert dynamodb_state._put_layout({
+        'shards': 1,
+        'version': layout['version'] + 1,
+        'migrating': True,
+        'target_shards': 4,
+        'migrating_since': time.time(),
+    }, layout['version'])
+
+    assert not dynamodb_state.migrate_layout(2)
+    assert dynamodb_state.migrate_layout(4)
+    assert dynamodb_state.get_layout() == {'shards': 4, 'version': 2, 'migrating': False}
+
+
+def index_kinds(state):
+    return {
+        item['kind']['S']
+        for item in state._parallel_scan(1)
+        if item['kind']['S'].startswith('environment')
+    }
+
+
+def test_index_keys_are_sharded_with_the_layout(dynamodb_state):
+    now = time.time()
+    for i in range(20):
+        dynamodb_state.put_environment('api', f"env-{i}", f"env-{i}.example.com")
+
+    assert index_kinds(dynamodb_state) == {'environment'}
+
+    assert dynamodb_state.migrate_layout(4)
+    dynamodb_state.put_environment('api', 'new', 'new.example.com')
+
+    assert index_kinds(dynamodb_state) == {f"environment#{i}" for i in range(4)}
+    assert dynamodb_state.count_environments_updated_between(now - 60, time.time()) == 21
+
+    oldest = dynamodb_state.fetch_oldest_environments(3, {'api': 21})
+    assert [e['name'] for e in oldest['api']] == ['env-0', 'env-1', 'env-2']
+
+    assert dynamodb_state.migrate_layout(1)
+    assert index_kinds(dynamodb_state) == {'environment'}
+
+
+def test_migrate_moves_rows_to_sharded_index_keys(dynamodb_state):
+    assert dynamodb_state.migrate_layout(4)
+    item = dynamodb_state._environment_key('api', 'old', 4)
+    dynamodb_state.table.put_item(Item={**item, 'profile': 'api', 'kind': 'environment',
+                                        'endpoint': 'old.example.com', 'last_updated': 1})
+
+    assert dynamodb_state.migrate_layout(4)
+
+    assert index_kinds(dynamodb_state) == {dynamodb.environment_kind('old', 4)}
+    assert listed(dynamodb_state) == {('api', 'old')}
+
+
+@pytest.mark.parametrize('source_shards,target_shards', [(4, 1), (1, 4), (2, 8)])
+def test_import_rekeys_rows_to_target_layout(dynamodb_state, tmp_path, source_shards, target_shards):
+    for i in range(10):
+        dynamodb_state.put_environment('api', f"env-{i}", f"env-{i}.example.com")
+    dynamodb_state.put_profile('api', {'name_prefix': 'api'})
+    assert dynamodb_state.migrate_layout(source_shards)
+
+    path = str(tmp_path / 'backup.ndjson.gz')
+    assert transfer.export_state(dynamodb_state, path, 2) == 11
+
+    target = dynamodb.DynamoDBState('eden-target')
+    assert target.check_remote_state_table(auto_create=True)
+    target.put_environment('web', 'w1', 'w1.example.com')
+    assert target.migrate_layout(target_shards)
+
+    assert transfer.import_state(target, path, 2) == 11
+
+    assert target.get_shards(refresh=True) == target_shards
+    assert listed(target) == listed(dynamodb_state) | {('web', 'w1')}
+    assert target.fetch_profile('api') == {'name_prefix': 'api'}
+    assert target.count_environments_by_profile() == {'api': 10, 'web': 1}
@@ -0,0 +1,100 @@
+import json
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from aws_eden_cli import ecr
+
+REGISTRY = '123456789012.dkr.ecr.us-east-1.amazonaws.com'
+
+
+@pytest.fixture
+def ecr_client():
+    with mock_aws():
+        client = boto3.client('ecr', region_name='us-east-1')
+        client.create_repository(repositoryName='api')
+        yield client
+
+
+def push(client, tag):
+    client.put_image(
+        repositoryName='api',
+        imageManifest=json.dumps({'schemaVersion': 2, 'tag': tag}),
+        imageManifestMediaType='application/vnd.docker.distribution.manifest.v2+json',
+        imageTag=tag,
+    )
+
+
+def count_batch_get_image(resolver):
+    calls = []
+    resolver._client('us-east-1').meta.events.register(
+        'provide-client-params.ecr.BatchGetImage', lambda params, **kwargs: calls.append(params['imageIds']))
+    return calls
+
+
+def test_tags_are_resolved_to_digests_in_batches(ecr_client, tmp_path, monkeypatch):
+    monkeypatch.setattr(ecr, 'BATCH_SIZE', 2)
+    for tag in ('v1', 'v2', 'v3'):
+        push(ecr_client, tag)
+
+    resolver = ecr.ImageResolver(cache_path=str(tmp_path / 'images.json'))
+    calls = count_batch_get_image(resolver)
+
+    image_uris = [f"{REGISTRY}/api:{tag}" for tag in ('v1', 'v2', 'v3', 'v1')]
+    resolved = resolver.resolve(image_uris)
+
+    assert len(calls) == 2
+    assert all(resolved[image_uri].startswith(f"{REGISTRY}/api@sha256:") for image_uri in image_uris)
+    assert resolved[f"{REGISTRY}/api:v1"] != resolved[f"{REGISTRY}/api:v2"]
+
+
+def test_resolved_tags_are_cached(ecr_client, tmp_path):
+    push(ecr_client, 'v1')
+    image_uri = f"{REGISTRY}/api:v1"
+
+    resolved = ecr.ImageResolver(cache_path=str(tmp_path / 'images.json')).resolve([image_uri])
+
+    resolver = ecr.ImageResolver(cache_path=str(tmp_path / 'images.json'))
+    calls = count_batch_get_image(resolver)
+
+    assert resolver.resolve([image_uri]) == resolved
+    assert calls == []
+
+
+def test_missing_tags_are_cached(ecr_client, tmp_path):
+    image_uri = f"{REGISTRY}/api:v1"
+    cache_path = str(tmp_path / 'images.json')
+
+    assert ecr.ImageResolver(cache_path=cache_path).resolve([image_uri]) == {image_uri: None}
+    push(ecr_client, 'v1')
+
+    assert ecr.ImageResolver(cache_path=cache_path).resolve([image_uri]) == {image_uri: None}
+
+
+def test_missing_tags_are_looked_up_again_after_negative_ttl(ecr_client, tmp_path):
+    image_uri = f"{REGISTRY}/api:v1"
+    resolver = ecr.ImageResolver(cache_path=str(tmp_path / 'images.json'), negative_ttl=-1)
+
+    assert resolver.resolve([image_uri]) == {image_uri: None}
+    push(ecr_client, 'v1')
+
+    assert resolver.resolve([image_uri])[image_uri] is not None
+
+
+def test_unwritable_cache_is_skipped(ecr_client, tmp_path):
+    push(ecr_client, 'v1')
+    (tmp_path / 'file').write_text('')
+
+    resolver = ecr.ImageResolver(cache_path=str(tmp_path / 'file' / 'images.json'))
+
+    assert resolver.resolve([f"{REGISTRY}/api:v1"])[f"{REGISTRY}/api:v1"] is not None
+
+
+def test_digest_and_non_ecr_uris_are_not_looked_up(ecr_client, tmp_path):
+    resolver = ecr.ImageResolver(cache_path=str(tmp_path / 'images.json'))
+    calls = count_batch_get_image(resolver)
+
+    pinned = f"{REGISTRY}/api@sha256:{'0' * 64}"
+    assert resolver.resolve([pinned, 'nginx:latest']) == {pinned: pinned, 'nginx:latest': None}
+    assert calls == []
@@ -0,0 +1,34 @@
+from moto import mock_aws
+
+from aws_eden_cli import consts, dynamodb, fanout
+
+
+def test_parse_targets():
+    assert fanout.parse_targets('us-east-1, eu-west-1:prod,us-west-2:prod:eden-prod,') == [
+        {'source': 'us-east-1', 'region': 'us-east-1', 'aws_profile': None, 'table_name': consts.DEFAULT_TABLE_NAME},
+        {'source': 'eu-west-1:prod', 'region': 'eu-west-1', 'aws_profile': 'prod',
+         'table_name': consts.DEFAULT_TABLE_NAME},
+        {'source': 'us-west-2:prod:eden-prod', 'region': 'us-west-2', 'aws_profile': 'prod',
+         'table_name': 'eden-prod'},
+    ]
+    assert fanout.parse_targets('') is None
+    assert fanout.parse_targets(':prod') is None
+    assert fanout.parse_targets('us-east-1:a:b:c') is None
+
+
+def test_duplicate_targets_are_rejected():
+    assert fanout.parse_targets('us-east-1,eu-west-1,us-east-1') is None
+    assert fanout.parse_targets(f"us-east-1,us-east-1::{consts.DEFAULT_TABLE_NAME}") is None
+    assert fanout.parse_targets('us-east-1,us-east-1::eden-other') is not None
+
+
+def test_unreachable_targets_are_reported():
+    with mock_aws():
+        state = dynamodb.DynamoDBState('eden')
+        assert state.check_remote_state_table(auto_create=True)
+        assert state.put_environment('api', 'foo', 'foo.example.com') is not None
+
+        environments, failed = fanout.fetch_all_environments(fanout.parse_targets('us-east-1,us-east-1::missing'))
+
+    assert [(e['name'], e['source']) for e in environments['api']] == [('foo', 'us-east-1')]
+    assert failed == ['us-east-1::missing']
@@ -0,0 +1,76 @@
+from aws_eden_cli import jobs
+from aws_eden_cli.state import JOB_FAILED, JOB_KIND, JOB_RUNNING, JOB_SUCCEEDED
+
+
+def queue_job(state):
+    job = jobs.create_job('create', 'api', 'foo', {'image_uri': 'image:1'}, {})
+    assert state.put_job(job)
+    return job['name']
+
+
+def test_job_is_claimed_once(local_state):
+    job_id = queue_job(local_state)
+
+    assert local_state.claim_job(job_id, 'worker-1', 60)
+    assert not local_state.claim_job(job_id, 'worker-2', 60)
+    assert local_state.fetch_queued_jobs(10) == []
+
+
+def test_expired_claim_is_requeued(local_state):
+    job_id = queue_job(local_state)
+    assert local_state.claim_job(job_id, 'crashed', -1)
+
+    queued = local_state.fetch_queued_jobs(10)
+    assert [(job['name'], job['status']) for job in queued] == [(job_id, JOB_RUNNING)]
+
+    assert local_state.claim_job(job_id, 'worker', 60)
+    assert not local_state.renew_job(job_id, 'crashed', 60)
+
+
+def test_worker_runs_queued_and_expired_jobs(local_state):
+    queued_id = queue_job(local_state)
+    expired_id = queue_job(local_state)
+    assert local_state.claim_job(expired_id, 'crashed', -1)
+
+    executed = {}
+
+    def execute(job, progress):
+        progress('step')
+        executed[job['name']] = job['status']
+        return {'name': job['environment_name']}
+
+    jobs.run_worker(local_state, execute, 2, 0.01, 60, once=True)
+
+    # jobs of crashed workers are run again (and resume their journal)
+    assert executed == {queued_id: 'queued', expired_id: JOB_RUNNING}
+    for job_id in (queued_id, expired_id):
+        job = local_state.fetch_job(job_id)
+        assert job['status'] == JOB_SUCCEEDED
+        assert job['steps'][0]['step'] == 'step'
+    assert local_state.fetch_queued_jobs(10) == []
+
+
+def test_finished_job_leaves_index(any_state):
+    job_id = queue_job(any_state)
+    assert any_state.claim_job(job_id, 'worker', 60)
+
+    jobs.JobProgress(any_state, job_id, 'worker').succeed({'name': 'foo'})
+
+    job = any_state.fetch_job(job_id)
+    assert (job['status'], job['kind']) == (JOB_SUCCEEDED, JOB_KIND)
+    assert 'last_updated' not in job
+    assert any_state.fetch_queued_jobs(10) == []
+
+
+def test_outcome_is_recorded_by_claiming_worker_only(any_state):
+    job_id = queue_job(any_state)
+    assert any_state.claim_job(job_id, 'crashed', -1)
+    assert any_state.claim_job(job_id, 'worker', 60)
+
+    # the worker whose claim expired finishes late
+    jobs.JobProgress(any_state, job_id, 'crashed').fail('timeout')
+    assert any_state.fetch_job(job_id)['status'] == JOB_RUNNING
+
+    jobs.JobProgress(any_state, job_id, 'worker').fail('error')
+    job = any_state.fetch_job(job_id)
+    assert (job['status'], job['error']) == (JOB_FAILED, 'error')
@@ -0,0 +1,66 @@
+import pytest
+
+from aws_eden_cli.journal import Journal
+from aws_eden_cli.state import JOURNAL_FAILED, JOURNAL_SUCCEEDED
+
+
+def run_steps(state, calls, fail_at=None, resume=False, verify=None):
+    journal = Journal(state, 'api', 'foo', 'create', {'image_uri': 'image:1'})
+    journal.start(resume)
+
+    for step in ['task_definition', 'target_group', 'service']:
+        def action(step=step):
+            calls.append(step)
+            if step == fail_at:
+                raise RuntimeError(f"{step} failed")
+            return {'arn': f"arn:{step}"}
+
+        journal.run(step, action, verify)
+
+    journal.finish()
+
+
+def test_resume_skips_completed_steps(local_state):
+    calls = []
+    with pytest.raises(RuntimeError):
+        run_steps(local_state, calls, fail_at='target_group')
+
+    assert local_state.fetch_journal('api', 'foo')['status'] == JOURNAL_FAILED
+
+    calls.clear()
+    run_steps(local_state, calls, resume=True)
+
+    assert calls == ['target_group', 'service']
+    journal = local_state.fetch_journal('api', 'foo')
+    assert journal['status'] == JOURNAL_SUCCEEDED
+    assert journal['steps']['task_definition']['resources'] == {'arn': 'arn:task_definition'}
+
+
+def test_resume_reruns_steps_whose_resources_are_gone(local_state):
+    calls = []
+    with pytest.raises(RuntimeError):
+        run_steps(local_state, calls, fail_at='service')
+
+    calls.clear()
+    run_steps(local_state, calls, resume=True, verify=lambda resources: resources['arn'] != 'arn:target_group')
+
+    assert calls == ['target_group', 'service']
+
+
+def test_resume_of_succeeded_journal_starts_from_the_beginning(local_state):
+    run_steps(local_state, [])
+
+    calls = []
+    run_steps(local_state, calls, resume=True)
+
+    assert calls == ['task_definition', 'target_group', 'service']
+
+
+def test_journal_with_different_parameters_is_not_resumed(local_state):
+    with pytest.raises(RuntimeError):
+        run_steps(local_state, [], fail_at='service')
+
+    journal = Journal(local_state, 'api', 'foo', 'create', {'image_uri': 'image:2'})
+    journal.start(resume=True)
+
+    assert journal.steps == {}
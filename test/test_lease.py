@@ -0,0 +1,107 @@
+import threading
+
+from aws_eden_cli import lease
+from aws_eden_cli.state import LEASE_FAILED, LEASE_SUCCEEDED
+
+
+def test_run_with_lease_returns_create_result(memory_state):
+    result = lease.run_with_lease(memory_state, 'api', 'foo', 'image:1', 60, lambda image_uri: {'image': image_uri})
+
+    assert result == {'image': 'image:1'}
+    assert memory_state.fetch_lease('api', 'foo')['status'] == LEASE_SUCCEEDED
+
+
+def test_concurrent_creates_coalesce_onto_newest_image(memory_state):
+    started = threading.Event()
+    requested = threading.Event()
+    deployed = []
+
+    def create(image_uri):
+        deployed.append(image_uri)
+        if len(deployed) == 1:
+            started.set()
+            # hold the lease until the second caller has requested its image
+            assert requested.wait(10)
+        return {'image': image_uri}
+
+    results = {}
+
+    def first():
+        results['first'] = lease.run_with_lease(memory_state, 'api', 'foo', 'image:1', 60, create)
+
+    holder = threading.Thread(target=first)
+    holder.start()
+    assert started.wait(10)
+
+    request_lease_image = memory_state.request_lease_image
+
+    def request_and_signal(*args):
+        r = request_lease_image(*args)
+        requested.set()
+        return r
+
+    memory_state.request_lease_image = request_and_signal
+    results['second'] = lease.run_with_lease(memory_state, 'api', 'foo', 'image:2', 60, create)
+    holder.join(10)
+
+    # the holder redeploys the requested image instead of the second caller deploying it
+    assert deployed == ['image:1', 'image:2']
+    assert results == {'first': {'image': 'image:2'}, 'second': {'image': 'image:2'}}
+
+
+def test_expired_lease_is_taken_over(memory_state):
+    assert memory_state.acquire_lease('api', 'foo', 'crashed', 'image:1', -1)
+
+    result = lease.run_with_lease(memory_state, 'api', 'foo', 'image:2', 60, lambda image_uri: {'image': image_uri})
+
+    assert result == {'image': 'image:2'}
+    assert memory_state.fetch_lease('api', 'foo')['holder'] != 'crashed'
+
+
+def test_follower_redeploys_after_holder_failed_with_other_image(memory_state):
+    started = threading.Event()
+    requested = threading.Event()
+    deployed = []
+
+    def create(image_uri):
+        deployed.append(image_uri)
+        if image_uri == 'image:1':
+            started.set()
+            assert requested.wait(10)
+            raise RuntimeError('deployment failed')
+        return {'image': image_uri}
+
+    def first():
+        try:
+            lease.run_with_lease(memory_state, 'api', 'foo', 'image:1', 60, create)
+        except RuntimeError:
+            pass
+
+    holder = threading.Thread(target=first)
+    holder.start()
+    assert started.wait(10)
+
+    request_lease_image = memory_state.request_lease_image
+
+    def request_and_signal(*args):
+        r = request_lease_image(*args)
+        requested.set()
+        return r
+
+    memory_state.request_lease_image = request_and_signal
+    result = lease.run_with_lease(memory_state, 'api', 'foo', 'image:2', 60, create)
+    holder.join(10)
+
+    assert deployed == ['image:1', 'image:2']
+    assert result == {'image': 'image:2'}
+    assert memory_state.fetch_lease('api', 'foo')['status'] == LEASE_SUCCEEDED
+
+
+def test_follower_gives_up_when_its_image_failed(memory_state):
+    holder = 'other'
+    assert memory_state.acquire_lease('api', 'foo', holder, 'image:1', 60)
+    assert memory_state.release_lease('api', 'foo', holder, LEASE_FAILED, 'image:1', None)
+    memory_state.acquire_lease = lambda *args: False
+    memory_state.request_lease_image = lambda *args: True
+
+    assert lease.run_with_lease(memory_state, 'api', 'foo', 'image:1', 60, lambda image_uri: {}) is None
@@ -0,0 +1,46 @@
+import sys
+import threading
+import uuid
+
+from aws_eden_cli import memory
+
+
+def test_instances_of_one_table_share_data(memory_state):
+    other = memory.MemoryState(memory_state.get_table_name())
+
+    memory_state.put_environment('api', 'foo', 'foo.example.com')
+
+    assert [e['name'] for e in other.fetch_all_environments()['api']] == ['foo']
+
+
+def test_separate_instances_acquire_lease_exclusively():
+    # switch threads as often as possible to widen the read-modify-write window
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        run_lease_races()
+    finally:
+        sys.setswitchinterval(interval)
+
+
+def run_lease_races():
+    for _ in range(200):
+        table_name = f"eden-{uuid.uuid4().hex[:8]}"
+        states = [memory.MemoryState(table_name) for _ in range(8)]
+        states[0].check_remote_state_table(auto_create=True)
+
+        barrier = threading.Barrier(len(states))
+        acquired = []
+
+        def acquire(state, holder):
+            barrier.wait()
+            if state.acquire_lease('api', 'foo', holder, 'image:1', 60):
+                acquired.append(holder)
+
+        threads = [threading.Thread(target=acquire, args=(state, f"holder-{i}")) for i, state in enumerate(states)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(acquired) == 1
@@ -0,0 +1,90 @@
+import time
+import uuid
+
+import pytest
+
+from aws_eden_cli import consts, memory, snapshot
+
+PROFILE = {parameter: f"{parameter}-value" for parameter in snapshot.REFERENCE_PARAMETERS}
+
+
+@pytest.fixture(autouse=True)
+def snapshot_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(consts, 'DEFAULT_SNAPSHOT_DIRECTORY', str(tmp_path / 'snapshots'))
+
+
+def create_snapshot(reference, ttl=60, profile=PROFILE):
+    return {
+        'id': uuid.uuid4().hex,
+        'version': 1,
+        'created_at': '2019-11-20T19:43:05.021346',
+        'expires_at': time.time() + ttl,
+        'parameters': {k: profile[k] for k in snapshot.REFERENCE_PARAMETERS},
+        'reference': reference,
+    }
+
+
+def push(state, profile_snapshot):
+    assert state.put_profile('api', PROFILE)
+    assert state.put_profile_snapshot('api', snapshot.dumps(profile_snapshot), profile_snapshot['id'])
+
+
+def test_local_copy_of_remote_snapshot_is_used(local_state):
+    local = create_snapshot('local')
+    push(local_state, dict(local, reference='remote'))
+    snapshot.save_local('api', local)
+
+    # IDs match, so the remote snapshot is not read
+    assert snapshot.load(local_state, 'api', PROFILE) == 'local'
+
+
+def test_snapshot_retaken_on_other_host_replaces_local_copy(local_state):
+    snapshot.save_local('api', create_snapshot('old'))
+    remote = create_snapshot('new')
+    push(local_state, remote)
+
+    assert snapshot.load(local_state, 'api', PROFILE) == 'new'
+    assert snapshot.load_local('api')['id'] == remote['id']
+
+
+def test_snapshot_invalidated_on_other_host_is_not_used(local_state):
+    local = create_snapshot('local')
+    push(local_state, local)
+    snapshot.save_local('api', local)
+    assert local_state.delete_profile_snapshot('api')
+
+    assert snapshot.load(local_state, 'api', PROFILE) is None
+
+
+def test_profile_that_was_never_pushed_uses_local_snapshot(local_state):
+    snapshot.save_local('api', create_snapshot('local'))
+
+    assert snapshot.load(local_state, 'api', PROFILE) == 'local'
+
+
+def test_local_snapshot_is_not_used_when_remote_id_cannot_be_read():
+    snapshot.save_local('api', create_snapshot('local'))
+    # table was never created
+    state = memory.MemoryState(f"eden-{uuid.uuid4().hex[:8]}")
+
+    assert state.fetch_profile_snapshot_id('api') is None
+    assert snapshot.load(state, 'api', PROFILE) is None
+
+
+def test_missing_profile_and_read_errors_are_distinguished(dynamodb_state):
+    assert dynamodb_state.fetch_profile_snapshot_id('api') is False
+
+    dynamodb_state.dynamodb_client.delete_table(TableName=dynamodb_state.get_table_name())
+    assert dynamodb_state.fetch_profile_snapshot_id('api') is None
+
+
+def test_expired_snapshot_is_not_used(local_state):
+    snapshot.save_local('api', create_snapshot('local', ttl=-1))
+
+    assert snapshot.load(local_state, 'api', PROFILE) is None
+
+
+def test_snapshot_of_other_profile_parameters_is_not_used(local_state):
+    snapshot.save_local('api', create_snapshot('local'))
+
+    assert snapshot.load(local_state, 'api', dict(PROFILE, target_cluster='other')) is None
@@ -0,0 +1,88 @@
+from aws_eden_cli import dynamodb
+
+
+def put_environments(state, environments):
+    # (profile name, name, last_updated) rows in export format, so timestamps can be set
+    assert state.batch_write_items([
+        {
+            'type': {'S': profile_name},
+            'name': {'S': name},
+            'kind': {'S': 'environment'},
+            'endpoint': {'S': f"{name}.example.com"},
+            'last_updated': {'N': str(last_updated)},
+        } for profile_name, name, last_updated in environments
+    ])
+
+
+def test_adjacent_ranges_do_not_overlap(any_state):
+    put_environments(any_state, [('api', 'a', 100), ('api', 'b', 200), ('web', 'c', 300)])
+
+    assert any_state.count_environments_updated_between(0, 100) == 1
+    assert any_state.count_environments_updated_between(100, 200) == 1
+    assert any_state.count_environments_updated_between(200, 300) == 1
+    assert any_state.count_environments_updated_between(0, 300) == 3
+    assert any_state.count_environments_updated_between(300, 400) == 0
+
+
+def test_counts_and_oldest_environments(any_state):
+    put_environments(any_state, [('api', f"api-{i}", 100 + i) for i in range(5)] +
+                     [('web', 'web-0', 50), ('web', 'web-1', 500)])
+
+    counts = any_state.count_environments_by_profile()
+    assert counts == {'api': 5, 'web': 2}
+
+    oldest = any_state.fetch_oldest_environments(3, counts)
+    assert {k: [e['name'] for e in v] for k, v in oldest.items()} == {
+        'api': ['api-0', 'api-1', 'api-2'],
+        'web': ['web-0', 'web-1'],
+    }
+    assert oldest['web'][0]['last_updated'] == 50
+
+
+def test_profiles_with_recent_environments_are_read_directly(dynamodb_state, monkeypatch):
+    monkeypatch.setattr(dynamodb, 'OLDEST_PAGE_SIZE', 2)
+    assert dynamodb_state.migrate_layout(2)
+    put_environments(dynamodb_state, [('old', f"old-{i}", 100 + i) for i in range(50)] +
+                     [('new', 'new-0', 1000), ('new', 'new-1', 1001)])
+
+    read = []
+    query_profile_environments = dynamodb_state._query_profile_environments
+
+    def spy(profile_name):
+        read.append(profile_name)
+        return query_profile_environments(profile_name)
+
+    dynamodb_state._query_profile_environments = spy
+
+    oldest = dynamodb_state.fetch_oldest_environments(2, {'old': 50, 'new': 2})
+
+    assert {k: [e['name'] for e in v] for k, v in oldest.items()} == {
+        'old': ['old-0', 'old-1'],
+        'new': ['new-0', 'new-1'],
+    }
+    # the index is not read to its end for the two environments of new
+    assert read == ['new']
+
+
+def test_leftovers_of_interrupted_migration_are_not_counted(dynamodb_state):
+    assert dynamodb_state.migrate_layout(4)
+    put_environments(dynamodb_state, [('api', f"env-{i}", 100 + i) for i in range(20)])
+
+    # copies of rows an interrupted 8 -> 4 shards migration did not remove
+    leftovers = [f"env-{i}" for i in range(20)
+                 if dynamodb.shard_key('api', f"env-{i}", 8) != dynamodb.shard_key('api', f"env-{i}", 4)]
+    assert len(leftovers) > 0
+    for name in leftovers:
+        dynamodb_state.table.put_item(Item={
+            **dynamodb_state._environment_key('api', name, 8),
+            'profile': 'api',
+            'kind': dynamodb.environment_kind(name, 8),
+            'endpoint': f"{name}.example.com",
+            'last_updated': 1,
+        })
+
+    assert dynamodb_state.count_environments_by_profile() == {'api': 20}
+    assert dynamodb_state.count_environments_updated_between(0, 1000) == 20
+
+    oldest = dynamodb_state.fetch_oldest_environments(2, {'api': 20})
+    assert [e['name'] for e in oldest['api']] == ['env-0', 'env-1']
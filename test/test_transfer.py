@@ -0,0 +1,100 @@
+import gzip
+import json
+import os
+import uuid
+
+from aws_eden_cli import jobs, memory, transfer
+
+
+def create_target_state():
+    # local_state may be the memory_state fixture itself, import into a separate table
+    state = memory.MemoryState(f"eden-{uuid.uuid4().hex[:8]}")
+    state.check_remote_state_table(auto_create=True)
+    return state
+
+
+def populate(state, count):
+    for i in range(count):
+        state.put_environment('api', f"env-{i}", f"env-{i}.example.com")
+
+
+def environment_names(state):
+    return sorted(environment['name'] for environment in state.fetch_all_environments().get('api', []))
+
+
+def test_export_import_round_trip(local_state, tmp_path):
+    target = create_target_state()
+    path = str(tmp_path / 'backup.ndjson.gz')
+    populate(local_state, 30)
+
+    assert transfer.export_state(local_state, path, 2) == 30
+    assert transfer.import_state(target, path, 2) == 30
+    assert environment_names(target) == environment_names(local_state)
+
+
+def test_import_resume_continues_from_checkpoint(memory_state, sqlite_state, tmp_path, monkeypatch):
+    path = str(tmp_path / 'backup.ndjson.gz')
+    populate(memory_state, 300)
+    assert transfer.export_state(memory_state, path, 1) == 300
+
+    # one window is 1 worker * 25 items * 4 batches, fail in the second window
+    monkeypatch.setattr(transfer, 'BATCHES_PER_WORKER', 4)
+    batch_write_items = sqlite_state.batch_write_items
+    written = []
+
+    def failing_batch_write_items(items):
+        if len(written) == 5:
+            return False
+        written.append(len(items))
+        return batch_write_items(items)
+
+    monkeypatch.setattr(sqlite_state, 'batch_write_items', failing_batch_write_items)
+
+    assert transfer.import_state(sqlite_state, path, 1) is None
+    assert transfer.read_checkpoint(path) == 100
+
+    monkeypatch.setattr(sqlite_state, 'batch_write_items', batch_write_items)
+
+    assert transfer.import_state(sqlite_state, path, 1, resume=True) == 300
+    assert not os.path.exists(transfer.checkpoint_path(path))
+    assert environment_names(sqlite_state) == environment_names(memory_state)
+
+
+def test_import_of_corrupt_file_fails(memory_state, tmp_path):
+    path = tmp_path / 'corrupt.ndjson.gz'
+    path.write_bytes(b'not gzip')
+
+    assert transfer.import_state(memory_state, str(path), 1) is None
+
+
+def test_export_contains_environments_and_profiles_only(local_state, tmp_path):
+    target = create_target_state()
+    path = str(tmp_path / 'backup.ndjson.gz')
+    populate(local_state, 3)
+    local_state.put_profile('api', {'name_prefix': 'api'})
+    local_state.acquire_lease('api', 'env-0', 'holder', 'image:1', 60)
+    local_state.put_job(jobs.create_job('create', 'api', 'env-0', {}, {}))
+    local_state.put_journal('api', 'env-0', {'operation': 'create', 'status': 'running', 'steps': {}})
+
+    assert transfer.export_state(local_state, path, 1) == 4
+    assert transfer.import_state(target, path, 1) == 4
+
+    assert environment_names(target) == ['env-0', 'env-1', 'env-2']
+    assert target.fetch_queued_jobs(10) == []
+    assert target.fetch_lease('api', 'env-0') is None
+
+
+def test_import_skips_rows_of_older_exports(memory_state, tmp_path):
+    path = tmp_path / 'old.ndjson.gz'
+    rows = [
+        {'type': {'S': 'api'}, 'name': {'S': 'foo'}, 'kind': {'S': 'environment'},
+         'endpoint': {'S': 'foo.example.com'}, 'last_updated': {'N': '1'}},
+        {'type': {'S': '_job'}, 'name': {'S': 'job-1'}, 'kind': {'S': 'job_queued'}, 'last_updated': {'N': '1'}},
+        {'type': {'S': '_meta'}, 'name': {'S': 'layout'}, 'kind': {'S': 'meta'}, 'shards': {'N': '4'}},
+    ]
+    with gzip.open(path, mode='wt') as f:
+        f.writelines(json.dumps(row) + '\n' for row in rows)
+
+    assert transfer.import_state(memory_state, str(path), 1) == 1
+    assert environment_names(memory_state) == ['foo']
+    assert memory_state.fetch_queued_jobs(10) == []